@@ -0,0 +1,144 @@
+"""CSC111 FINAL PROJECT: UT-TABLER
+
+===============================
+
+This python module is a headless command-line interface for generating timetables in bulk, without the GUI.
+It reads one request per line as JSON, for example
+
+    {"id": "student-1", "courses": ["CSC108H1-F", "MAT135H1-F"], "ranks": [1, 2, 0]}
+
+where ranks lists the scores in order of priority (0 for the distance between buildings, 1 for morning classes and
+2 for evening classes, as in get_ttables_ranked) and defaults to [0, 1, 2]. For each request it writes one line of
+JSON with the ranked timetables, in the same order as the requests, and it writes timing and throughput statistics
+for the whole run to stderr at the end.
+
+    python batch_cli.py requests.jsonl --workers 4 > timetables.jsonl
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the users of the UT-TABLER application.
+All forms of distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, TextIO
+
+from timetable_requests import load_catalog, percentile, timetables_json, validate_request
+
+IN_FLIGHT_PER_WORKER = 4  # The number of requests queued for each worker process at a time
+
+
+def solve_request(line: str) -> dict:
+    """
+    Return the response to one line of the input: the request's id, its courses and ranks, the ranked timetables
+    (see timetables_json), and the number of seconds spent on it. If the request is invalid, the response has an
+    error message instead of timetables.
+    """
+    start = time.perf_counter()
+    response = {'id': None}
+    try:
+        request = json.loads(line)
+        response['id'] = request.get('id') if isinstance(request, dict) else None
+        courses, ranks = validate_request(request)
+    except json.JSONDecodeError as error:
+        response['error'] = f'invalid request: {error}'
+    except ValueError as error:
+        response['error'] = str(error)
+    else:
+        response.update(courses=courses, ranks=ranks, timetables=timetables_json(courses, ranks))
+    response['seconds'] = time.perf_counter() - start
+    return response
+
+
+def iter_responses(lines: Iterable[str], workers: int) -> Iterator[dict]:
+    """
+    Yield the response to each non-blank line in lines, in order. If workers is more than 1, the requests are solved
+    by a pool of that many processes, with at most IN_FLIGHT_PER_WORKER requests per worker waiting at a time, so
+    the input is read as the responses are written instead of all at once.
+
+    Preconditions:
+    - workers >= 1
+    """
+    requests = (line for line in lines if line.strip())
+    if workers == 1:
+        yield from map(solve_request, requests)
+        return
+
+    pending: deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_catalog) as executor:
+        for line in requests:
+            pending.append(executor.submit(solve_request, line))
+            if len(pending) >= IN_FLIGHT_PER_WORKER * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_batch(lines: Iterable[str], out: TextIO, workers: int) -> dict:
+    """
+    Write the response to each request in lines to out as a line of JSON, and return statistics about the run: the
+    number of requests, how many of them failed, the wall-clock time, the throughput, and the mean, median, 95th
+    percentile and maximum time spent on a request (all times in seconds).
+
+    Preconditions:
+    - workers >= 1
+    """
+    start = time.perf_counter()
+    load_catalog()
+    loaded = time.perf_counter()
+    seconds, failed = [], 0
+    for response in iter_responses(lines, workers):
+        out.write(json.dumps(response) + '\n')
+        out.flush()
+        seconds.append(response['seconds'])
+        failed += 'error' in response
+    wall = time.perf_counter() - start
+
+    seconds.sort()
+    return {'requests': len(seconds), 'failed': failed, 'workers': workers,
+            'catalog_seconds': loaded - start, 'wall_seconds': wall,
+            'requests_per_second': len(seconds) / wall if wall > 0 else 0.0,
+            'mean_seconds': sum(seconds) / len(seconds) if seconds else 0.0,
+            'median_seconds': percentile(seconds, 0.5), 'p95_seconds': percentile(seconds, 0.95),
+            'max_seconds': seconds[-1] if seconds else 0.0}
+
+
+def main(argv: list[str]) -> int:
+    """Run the command-line interface with the given arguments, and return the exit status, which is 1 if any request
+    failed."""
+    parser = argparse.ArgumentParser(description='Generate ranked timetables for JSON Lines requests.')
+    parser.add_argument('requests', nargs='?', default='-',
+                        help='the file of requests, one JSON object per line (default: standard input)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='the file to write the responses to (default: standard output)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='the number of worker processes (default: the number of CPUs)')
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    with _open(args.requests, 'r', sys.stdin) as lines, _open(args.output, 'w', sys.stdout) as out:
+        stats = run_batch(lines, out, args.workers)
+    print(json.dumps(stats), file=sys.stderr)
+    return 1 if stats['failed'] else 0
+
+
+def _open(path: str, mode: str, default: TextIO) -> TextIO:
+    """Open the file at path with the given mode, or return a wrapper around default if path is '-' that doesn't
+    close it."""
+    if path == '-':
+        return open(default.fileno(), mode, encoding='utf-8', closefd=False)
+    return open(path, mode, encoding='utf-8')
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,190 @@
+"""CSC111 FINAL PROJECT: UT-TABLER
+
+===============================
+
+This python module contains the functions necessary to score large batches
+of candidate timetables at once with NumPy, instead of scoring one timetable
+at a time with Python loops.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the users of the UT-TABLER application.
+All forms of distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
+"""
+from typing import Iterator
+
+import numpy as np
+
+from distances import building_distance
+from schedule_tree import SLOTS_PER_DAY, SLOTS_PER_HOUR, SectInfo, check_conflict
+
+BLOCK_SIZE = 4096
+
+
+class BatchScorer:
+    """Scores blocks of candidate timetables for a fixed course_dict with NumPy.
+
+    A candidate timetable is a row of section positions, one for each course in course_names, so a block of
+    candidates is a 2D integer array. Every section is compiled once into arrays: its number of morning and evening
+    classes, and a row with one column for each slot (of some semester and day) in which any lecture of these courses
+    starts, holding 1 + the id of the building of the section's lecture that starts in that slot (or 0). The columns
+    are in time order, and since the sections of a candidate never conflict, adding up their rows gives the buildings
+    of all its lectures in order, so consecutive lectures can be found without sorting.
+
+    Instance Attributes:
+    - morning: For each course in order, the number of morning classes of each of its sections
+    - evening: For each course in order, the number of evening classes of each of its sections
+    - starts: For each course in order, the lecture start row of each of its sections
+    - days: The semester and day (as sem * len(DAYS) + day) of each column of the lecture start rows
+    - distances: The distance between each pair of building ids
+
+    Representation Invariants:
+    - len(self.morning) == len(self.evening) == len(self.starts)
+    """
+    morning: list[np.ndarray]
+    evening: list[np.ndarray]
+    starts: list[np.ndarray]
+    days: np.ndarray
+    distances: np.ndarray
+
+    def __init__(self, course_dict: dict[str, list[SectInfo]], course_names: list[str]) -> None:
+        # The (semester, day, slot) of the start of every lecture, numbered the same way as in compile_occupancy,
+        # and its building code
+        lectures = [[_lecture_starts(sect) for sect in course_dict[name]] for name in course_names]
+        columns = sorted({slot for course in lectures for starts in course for slot, _ in starts})
+        column_of = {slot: i for i, slot in enumerate(columns)}
+        self.days = np.array([slot // SLOTS_PER_DAY for slot in columns], dtype=np.int64)
+
+        buildings = {}
+        self.morning, self.evening, self.starts = [], [], []
+        for name, course in zip(course_names, lectures):
+            self.morning.append(np.array([sect.compiled.morning for sect in course_dict[name]], dtype=np.int64))
+            self.evening.append(np.array([sect.compiled.evening for sect in course_dict[name]], dtype=np.int64))
+            starts = np.zeros((len(course), len(columns)), dtype=np.int16)
+            for i, sect_starts in enumerate(course):
+                for slot, code in sect_starts:
+                    starts[i, column_of[slot]] = buildings.setdefault(code, len(buildings)) + 1
+            self.starts.append(starts)
+
+        codes = list(buildings)
+        self.distances = np.array([[building_distance(start, end) for end in codes] for start in codes],
+                                  dtype=np.float64).reshape(len(codes), len(codes))
+
+    def score(self, candidates: np.ndarray, ranks: list[int]) -> np.ndarray:
+        """
+        Return a matrix with one row for each candidate in the block, holding the average distance between
+        consecutive lectures, the number of morning classes, and the number of evening classes in the order given by
+        ranks (as in _compute_scores). np.lexsort(scores.T[::-1]) orders the candidates from best to worst.
+
+        The scores are the same as those of _compute_scores, except that the average distance may differ in the last
+        bit, since the distances are added up in a different order.
+
+        Preconditions:
+        - candidates.ndim == 2 and candidates.shape[1] == len(self.starts)
+        - the sections of each candidate do not conflict
+        - set(ranks) == {0, 1, 2}
+        """
+        num = candidates.shape[0]
+        scores = np.zeros((num, 3), dtype=np.float64)
+        starts = np.zeros((num, len(self.days)), dtype=np.int16)
+        for c in range(len(self.starts)):
+            scores[:, 1] += self.morning[c][candidates[:, c]]
+            scores[:, 2] += self.evening[c][candidates[:, c]]
+            starts += self.starts[c][candidates[:, c]]
+
+        rows, columns = np.nonzero(starts)
+        buildings = starts[rows, columns] - 1
+        # Consecutive lectures are next to each other in (rows, columns) and on the same semester and day
+        days = self.days[columns]
+        consecutive = (rows[1:] == rows[:-1]) & (days[1:] == days[:-1])
+        pair_rows = rows[1:][consecutive]
+        pair_dists = self.distances[buildings[:-1][consecutive], buildings[1:][consecutive]]
+
+        # The average is over the set of distinct distances in each candidate, as in _compute_scores
+        order = np.lexsort((pair_dists, pair_rows))
+        pair_rows, pair_dists = pair_rows[order], pair_dists[order]
+        distinct = np.ones(len(pair_rows), dtype=bool)
+        distinct[1:] = (pair_rows[1:] != pair_rows[:-1]) | (pair_dists[1:] != pair_dists[:-1])
+        totals = np.bincount(pair_rows[distinct], weights=pair_dists[distinct], minlength=num)
+        counts = np.bincount(pair_rows[distinct], minlength=num)
+        scores[:, 0] = np.divide(totals, counts, out=np.zeros(num), where=counts > 0)
+
+        return scores[:, ranks]
+
+
+def best_candidates(course_dict: dict[str, list[SectInfo]], course_names: list[str], ranks: list[int],
+                    k: int) -> list[tuple[int, ...]]:
+    """
+    Return the section positions of the best k conflict-free timetables of course_dict in ranked order, found by
+    scoring every timetable a block at a time. Ties are broken by the section positions, like a stable sort of the
+    timetables in the order of iter_ttables.
+
+    Preconditions:
+    - set(ranks) == {0, 1, 2}
+    - k > 0
+    """
+    scorer = BatchScorer(course_dict, course_names)
+    best = np.zeros((0, len(course_names)), dtype=np.int64)
+    best_scores = np.zeros((0, 3), dtype=np.float64)
+    for block in iter_candidate_blocks(course_dict, course_names):
+        candidates = np.concatenate((best, block))
+        scores = np.concatenate((best_scores, scorer.score(block, ranks)))
+        # np.lexsort sorts by its last key first
+        order = np.lexsort(tuple(candidates.T[::-1]) + tuple(scores.T[::-1]))[:k]
+        best, best_scores = candidates[order], scores[order]
+    return [tuple(int(position) for position in row) for row in best]
+
+
+def _lecture_starts(sect: SectInfo) -> list[tuple[int, str]]:
+    """
+    Return the slot (numbered as in compile_occupancy) in which each lecture of a section starts in each semester it
+    runs in, together with the building code of its room in that semester.
+    """
+    return [(d * SLOTS_PER_DAY + round(start * SLOTS_PER_HOUR), code)
+            for d, lectures in sect.compiled.days for start, _, code in lectures]
+
+
+def iter_candidate_blocks(course_dict: dict[str, list[SectInfo]], course_names: list[str],
+                          block_size: int = BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Yield every conflict-free timetable of course_dict as blocks of at most block_size candidates for
+    BatchScorer.score, in the same order as iter_ttables.
+
+    Preconditions:
+    - all(name in course_dict for name in course_names)
+    - block_size > 0
+    """
+    block = []
+    for positions in _iter_positions(course_dict, course_names, 0, []):
+        block.append(positions)
+        if len(block) == block_size:
+            yield np.array(block, dtype=np.int64)
+            block = []
+    if block:
+        yield np.array(block, dtype=np.int64)
+
+
+def _iter_positions(course_dict: dict[str, list[SectInfo]], course_names: list[str], occupied: int,
+                    prefix: list[int]) -> Iterator[tuple[int, ...]]:
+    """
+    A helper generator for iter_candidate_blocks that yields the section positions of every conflict-free way of
+    completing prefix with sections of the courses in course_names.
+    """
+    if not course_names:
+        if prefix:
+            yield tuple(prefix)
+        return
+    for position, section_info in enumerate(course_dict[course_names[0]]):
+        if not check_conflict(occupied, section_info.occupancy):
+            prefix.append(position)
+            yield from _iter_positions(course_dict, course_names[1:], occupied | section_info.occupancy, prefix)
+            prefix.pop()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
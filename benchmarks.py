@@ -0,0 +1,226 @@
+"""CSC111 FINAL PROJECT: UT-TABLER
+
+===============================
+
+This python module is a reproducible benchmark suite for the hot paths of UT-TABLER: parsing the course data,
+building and walking the Schedule tree, scoring timetables, exporting a timetable, and the full ranked search. Every
+benchmark runs on the same fixed course sets from data/course_info.csv, from a single course up to pathological sets
+of year-long courses with 15 to 18 sections each, and records its time and peak memory in a JSON results file that
+can be compared with the results of an earlier run.
+
+    python benchmarks.py -o before.json
+    python benchmarks.py -o after.json --compare before.json
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the users of the UT-TABLER application.
+All forms of distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+from parse_functions import clear_parsed_courses, parse_course_csv
+from schedule_tree import Schedule, iter_ttables
+from table_visualization import make_timetable, render_timetable
+from tree_computations import _compute_scores, get_ttables_ranked
+
+# The course sets every benchmark runs on, from smallest to largest, with the number of conflict-free timetables of
+# each, and whether it is small enough to build the whole Schedule tree for
+COURSE_SETS = {
+    'tiny': (['CSC108H1-F'], True),  # 9 timetables
+    'small': (['MAT135H1-F', 'CSC108H1-F', 'MAT223H1-F'], True),  # 627 timetables
+    'medium': (['MAT135H1-F', 'RSM222H1-F', 'CSC108H1-F', 'MAT223H1-F'], True),  # 5,799 timetables
+    'large': (['MAT135H1-F', 'RSM222H1-F', 'RSM332H1-F', 'CSC108H1-F', 'MAT223H1-F', 'ECO101H1-F'],
+              True),  # 155,006 timetables
+    'year_long': (['PSY299Y1-Y', 'PSY399Y1-Y', 'IFP010Y1-Y', 'IFP020Y1-Y', 'IFP030Y1-Y'],
+                  False),  # 500,256 timetables, of 18, 18, 15, 15 and 15 sections
+    'pathological': (['MAT135H1-F', 'RSM222H1-F', 'PSY299Y1-Y', 'PSY399Y1-Y', 'IFP010Y1-Y', 'MAT136H1-S',
+                      'RSM333H1-S'], False),  # 29,193,048 timetables
+    'two_terms': (['MAT135H1-F', 'RSM222H1-F', 'CSC108H1-F', 'MAT223H1-F', 'MAT136H1-S', 'RSM333H1-S', 'CSC148H1-S',
+                   'ECO102H1-S'], False),  # 14,265,540 timetables, from 5,799 fall and 2,460 winter ones
+}
+SCORE_SAMPLE = 5000  # The number of timetables scored by the _compute_scores benchmark
+RANKS = [0, 1, 2]
+
+
+def _bench_parse(courses: list[str]) -> Callable[[], object]:
+    """Parse the courses from course_info.csv, without any of them already parsed."""
+    def run() -> object:
+        clear_parsed_courses()
+        return parse_course_csv(set(courses))
+    return run
+
+
+def _bench_add_sections(courses: list[str]) -> Callable[[], object]:
+    """Build the whole Schedule tree of the courses."""
+    course_dict = parse_course_csv(set(courses))
+
+    def run() -> object:
+        tree = Schedule(None)
+        tree.add_sections(course_dict, sorted(course_dict), 0)
+        return tree
+    return run
+
+
+def _bench_accumulate(courses: list[str]) -> Callable[[], object]:
+    """Collect every path of an already built Schedule tree of the courses."""
+    course_dict = parse_course_csv(set(courses))
+    tree = Schedule(None)
+    tree.add_sections(course_dict, sorted(course_dict), 0)
+    return tree.accumulate_ttables
+
+
+def _bench_scores(courses: list[str]) -> Callable[[], object]:
+    """Score the first SCORE_SAMPLE timetables of the courses."""
+    course_dict = parse_course_csv(set(courses))
+    ttables = [list(ttable) for ttable in itertools.islice(iter_ttables(course_dict, sorted(course_dict)),
+                                                           SCORE_SAMPLE)]
+    return lambda: [_compute_scores(ttable, RANKS) for ttable in ttables]
+
+
+def _bench_make_timetable(courses: list[str]) -> Callable[[], object]:
+    """Export the best timetable of the courses as a spreadsheet and render it as HTML."""
+    ttable = get_ttables_ranked(set(courses), RANKS)[0]
+    filename = os.path.join(tempfile.gettempdir(), 'ut_tabler_benchmark.xlsx')
+
+    def run() -> object:
+        make_timetable(ttable, filename)
+        return render_timetable(ttable)
+    return run
+
+
+def _bench_ranked(courses: list[str]) -> Callable[[], object]:
+    """Find the best timetables of the courses (with the course data already parsed)."""
+    parse_course_csv(set(courses))
+    return lambda: get_ttables_ranked(set(courses), RANKS)
+
+
+# Every benchmark, by the name of the function it measures, with a function that prepares it for a course set (and
+# returns the function to time), and whether it builds the whole Schedule tree
+BENCHMARKS = {
+    'parse_course_csv': (_bench_parse, False),
+    'Schedule.add_sections': (_bench_add_sections, True),
+    'Schedule.accumulate_ttables': (_bench_accumulate, True),
+    '_compute_scores': (_bench_scores, False),
+    'make_timetable': (_bench_make_timetable, False),
+    'get_ttables_ranked': (_bench_ranked, False),
+}
+
+
+def measure(run: Callable[[], object], repeat: int) -> dict:
+    """
+    Return the time taken by each of repeat calls of run (in seconds), their minimum and median, and the peak memory
+    allocated during one more call (in bytes, measured separately since tracing slows the call down). run is called
+    once before it is timed, so that lazy imports and caches that last for the whole program aren't counted.
+
+    Preconditions:
+    - repeat >= 1
+    """
+    run()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'times': times, 'min_seconds': min(times), 'median_seconds': statistics.median(times),
+            'peak_memory_bytes': peak}
+
+
+def run_benchmarks(benchmarks: list[str], sets: list[str], repeat: int) -> dict:
+    """Run the given benchmarks on the given course sets, and return the results together with a description of the
+    machine and the version of the code they were run on."""
+    results = []
+    for name in benchmarks:
+        prepare, needs_tree = BENCHMARKS[name]
+        for set_name in sets:
+            courses, tree_sized = COURSE_SETS[set_name]
+            if needs_tree and not tree_sized:
+                continue
+            result = measure(prepare(courses), repeat)
+            results.append({'benchmark': name, 'course_set': set_name, **result})
+            print(f'{name:28} {set_name:13} {result["median_seconds"]:10.4f}s '
+                  f'{result["peak_memory_bytes"] / 2 ** 20:9.1f} MiB', file=sys.stderr)
+
+    return {'metadata': {'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'commit': _git_commit(),
+                         'python': platform.python_version(), 'platform': platform.platform(),
+                         'cpus': os.cpu_count(), 'repeat': repeat},
+            'results': results}
+
+
+def _git_commit() -> str:
+    """Return the commit the code is at, or '' if it isn't in a git repository."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    """Return a line for each result in new that is also in old, with how many times slower (above 1) or faster
+    (below 1) its median time is, and how its peak memory changed."""
+    old_results = {(result['benchmark'], result['course_set']): result for result in old['results']}
+    lines = []
+    for result in new['results']:
+        before = old_results.get((result['benchmark'], result['course_set']))
+        if before is not None:
+            lines.append(f'{result["benchmark"]:28} {result["course_set"]:13} time x'
+                         f'{result["median_seconds"] / max(before["median_seconds"], 1e-9):.2f}  memory x'
+                         f'{result["peak_memory_bytes"] / max(before["peak_memory_bytes"], 1):.2f}')
+    return lines
+
+
+def main(argv: list[str]) -> None:
+    """Run the benchmarks chosen by the given command-line arguments and save the results."""
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of UT-Tabler.')
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help='the JSON file to save the results to (default: benchmark_results.json)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='the number of timed runs of each benchmark')
+    parser.add_argument('-b', '--benchmarks', default=','.join(BENCHMARKS),
+                        help='a comma-separated list of the benchmarks to run (default: all)')
+    parser.add_argument('-s', '--sets', default=','.join(COURSE_SETS),
+                        help='a comma-separated list of the course sets to use (default: all)')
+    parser.add_argument('--compare', help='a results file from an earlier run to compare the results with')
+    args = parser.parse_args(argv)
+
+    benchmarks, sets = args.benchmarks.split(','), args.sets.split(',')
+    unknown = [name for name in benchmarks if name not in BENCHMARKS] + [name for name in sets
+                                                                          if name not in COURSE_SETS]
+    if unknown or args.repeat < 1:
+        parser.error(f'unknown benchmarks or course sets: {", ".join(unknown)}' if unknown
+                     else '--repeat must be at least 1')
+
+    results = run_benchmarks(benchmarks, sets, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            print('\n'.join(compare(json.load(file), results)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+"""CSC111 FINAL PROJECT: UT-TABLER
+
+===============================
+
+This python module contains the functions necessary to compute the distances between buildings that the average
+distance score is based on, and a lower bound on that score for partial timetables. It is shared by the search in
+tree_computations and the NumPy scorer in batch_scoring.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the users of the UT-TABLER application.
+All forms of distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
+"""
+from array import array
+from functools import lru_cache
+from math import cos
+
+from parse_functions import parse_buildings, parse_course_buildings
+from schedule_tree import SLOTS_PER_DAY
+
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+
+def building_distance(start: str, end: str) -> float:
+    """
+    Return the distance (in km) between the buildings with the given building codes, as used for the average distance
+    score.
+    """
+    index, matrix, max_dist = load_building_distances()
+    # NOTE, IF A BUILDING ISN'T AVAILABLE, WE ASSUME MAX DISTANCE BETWEEN BUILDINGS
+    if 'NA' in (start, end) or not len(start) == len(end) == 2:
+        return max_dist
+    elif start == end or start not in index or end not in index:
+        # Buildings missing from building_info.csv have no coordinates, so they are treated as 0 km apart
+        return 0.0
+    else:
+        return matrix[index[start]][index[end]]
+
+
+@lru_cache(maxsize=None)
+def load_building_distances() -> tuple[dict[str, int], list[array], float]:
+    """
+    Return a mapping from every building code in building_info.csv to its row in a matrix of the distances (in km)
+    between every pair of buildings, the matrix itself, and the largest distance between two buildings that are used
+    by course_info.csv (which is assumed when a building isn't available). This is only computed the first time it is
+    called.
+    """
+    buildings = parse_buildings()
+    index = {code: i for i, code in enumerate(buildings)}
+    coordinates = list(buildings.values())
+    matrix = [array('d', [0.0] * len(coordinates)) for _ in coordinates]
+    for i, (lat1, lon1) in enumerate(coordinates):
+        for j in range(i + 1, len(coordinates)):
+            lat2, lon2 = coordinates[j]
+            # Uses the Equirectangular approximation formula to calculate distance, where:
+            # x = change in longitude * cos(mean latitude)
+            # y = change in latitude
+            # dist = earth's radius * sqrt(x^2 + y^2)
+            matrix[i][j] = matrix[j][i] = 6371 * (((lon2 - lon1) * cos((lat1 + lat2) / 2)) ** 2
+                                                  + (lat2 - lat1) ** 2) ** 0.5
+
+    used = [index[code] for code in parse_course_buildings() if code in index]
+    max_dist = max((matrix[i][j] for i in used for j in used), default=0.0)
+    return index, matrix, max_dist
+
+
+def distance_lower_bound(days: list[list], dists: list[list[float]], reach: int, new_lectures: int) -> float:
+    """
+    Return a lower bound on the average distance score of any timetable that extends a partial timetable, whose
+    lectures and consecutive distances on each semester and day are given by days and dists, with sections whose
+    combined occupancy is within reach and which add at most new_lectures lectures in total.
+
+    The lectures on a day that reach does not touch are final, so the set of distances between them will be part of
+    the final set. Every other final distance is at least 0, and there can be at most one per lecture on the days
+    that reach does touch.
+    """
+    final_dists = set()
+    open_lectures = new_lectures
+    for d in range(len(days)):
+        if reach >> (d * SLOTS_PER_DAY) & DAY_MASK:
+            open_lectures += len(days[d])
+        else:
+            final_dists.update(dists[d])
+
+    if not final_dists:
+        return 0
+    return sum(final_dists) / (len(final_dists) + open_lectures)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
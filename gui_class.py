@@ -17,16 +17,78 @@ expressly prohibited.
 This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
 """
 
-import time
+from collections import OrderedDict
 from typing import Optional
 from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QComboBox, QSplashScreen
-from PyQt5.QtGui import QFont, QPixmap, QIcon
-from PyQt5.QtCore import Qt
-from PyQt5.QtWebEngineWidgets import QWebEngineView
+from PyQt5.QtGui import QCloseEvent, QFont, QPixmap, QIcon
+from PyQt5.QtCore import Qt, QStringListModel, QThread, QTimer, pyqtSignal
+
+HTML_CACHE_SIZE = 32
+SPLASH_TIME = 1000  # How long the splash screen is shown for, in milliseconds
+
+
+class TimetableWorker(QThread):
+    """Thread that gets the timetables from a SearchSession off the GUI thread, reporting its progress and the best
+    timetables found so far with the progressed signal, and the final timetables with the found signal. The metrics
+    of the search are kept in stats once it is done, unless the timetables were already in the session."""
+    progressed = pyqtSignal(int, int, object)
+    found = pyqtSignal(object)
+
+    def __init__(self, session: object, wanted: set[str], ranks: list[int], parent: Optional[QWidget] = None) -> None:
+        QThread.__init__(self, parent)
+        self.session = session
+        self.wanted = wanted
+        self.ranks = ranks
+        self.cancelled = False
+        self.stats = None
+
+    def run(self) -> None:
+        """Method run in the new thread which computes the timetables"""
+        # The search modules are only imported once they are needed, so that they don't slow down startup
+        from tree_computations import SearchCancelled, SearchStats
+        ttables = self.session.lookup(self.wanted, self.ranks)
+        if ttables is None:
+            stats = SearchStats()
+            try:
+                ttables = self.session.get_ttables(self.wanted, self.ranks, progress=self.report, stats=stats)
+            except SearchCancelled:
+                return None
+            self.stats = stats
+        # A search can finish before its next progress report, so a cancelled one must not send its timetables either
+        if not self.cancelled:
+            self.found.emit(ttables)
+        return None
+
+    def report(self, nodes: int, scored: int, ttables: list) -> None:
+        """Progress callback for get_ttables_ranked which stops the search if it has been cancelled"""
+        if self.cancelled:
+            from tree_computations import SearchCancelled
+            raise SearchCancelled
+        self.progressed.emit(nodes, scored, ttables)
+
+    def cancel(self) -> None:
+        """Method which asks the search to stop at its next progress report"""
+        self.cancelled = True
 
 
-from tree_computations import get_ttables_ranked
-from table_visualization import make_timetable
+class CandidatesWorker(TimetableWorker):
+    """Thread that finds the best timetables of a set of courses under every ranking of the preferences in the
+    background, and sends them as RankedCandidates with the found signal, so that the results screen can change the
+    ranking without searching again"""
+
+    def __init__(self, session: object, wanted: set[str], parent: Optional[QWidget] = None) -> None:
+        TimetableWorker.__init__(self, session, wanted, [], parent)
+
+    def run(self) -> None:
+        """Method run in the new thread which computes the timetables under every ranking"""
+        from tree_computations import SearchCancelled
+        try:
+            candidates = self.session.get_candidates(self.wanted, progress=self.report)
+        except SearchCancelled:
+            return None
+        if not self.cancelled:
+            self.found.emit(candidates)
+        return None
 
 
 class Program(QWidget):
@@ -35,19 +97,29 @@ class Program(QWidget):
     def __init__(self, wordlist: list, parent: Optional[QWidget] = None) -> None:
         QWidget.__init__(self, parent)
         self.wordlist = wordlist
+        self.known_courses = set(wordlist)
         self.pref_rank = [0, 0, 0]
         self.index = 0
+        self.ttables = []
+        self.worker = None
+        self.speculation = None
+        self.reranker = None
+        self.candidates = None
+        self.session = None
+        self.total = 0
+        self.browsing = False
+        self.html_cache = OrderedDict()
 
         self.resize(1000, 667)
         self.setWindowTitle("UT-Tabler")
         self.setWindowIcon(QIcon('assets/icon.svg'))
 
         image = QPixmap('assets/logo.svg')
-        splash = QSplashScreen(image, Qt.WindowStaysOnTopHint)
-        splash.resize(int(1920 * .5), int(1080 * .5))
-        splash.show()
-        time.sleep(1)
-        splash.close()
+        self.splash = QSplashScreen(image, Qt.WindowStaysOnTopHint)
+        self.splash.resize(int(1920 * .5), int(1080 * .5))
+        self.splash.show()
+        # The splash screen closes itself later, so the window can be built (and used) while it is showing
+        QTimer.singleShot(SPLASH_TIME, self.splash.close)
 
         self.title = QLabel(self)
         self.title.setText("Welcome to the UT-Tabler!")
@@ -61,8 +133,10 @@ class Program(QWidget):
 
         self.selectedc = set()
         self.cb = QComboBox(self)
-        self.cb.addItems(self.wordlist)
+        # The course list is shared with the combobox through a model instead of adding each course as an item
+        self.course_model = QStringListModel(self.wordlist, self)
         self.cb.setEditable(True)
+        self.cb.setModel(self.course_model)
         self.cb.resize(int(1920 * .1), int(1080 * .05))
         self.cb.move(int(1920 * .008), int(1080 * .1))
 
@@ -130,17 +204,72 @@ class Program(QWidget):
         self.err_lbl.setStyleSheet("QLabel { color : red; }")
         self.err_lbl.move(int(1920 * .008), int(1080 * .48))
 
+        self.status_lbl = QLabel(self)
+        self.status_lbl.setText('')
+        self.status_lbl.setFont(QFont('Helvetica', 10))
+        self.status_lbl.move(int(1920 * .008), int(1080 * .51))
+
+        self.cancelbtn = QPushButton(self)
+        self.cancelbtn.setText("Cancel")
+        self.cancelbtn.move(int(1920 * .12), int(1080 * .43))
+        self.cancelbtn.resize(int(1920 * .1), int(1080 * .05))
+        self.cancelbtn.setStyleSheet("background-color: lightgray")
+        self.cancelbtn.clicked.connect(self.cancel_search)
+        self.cancelbtn.hide()
+
     def course_select(self) -> None:
         """Function which adds a course to the list after selecting on the combobox, self.cb"""
         self.selectedc.add(self.cb.currentText())
         self.select_lbl.setText("Selected Courses: " + ', '.join(self.selectedc))
         self.select_lbl.adjustSize()
+        self.speculate()
 
     def clear_selected(self) -> None:
         """Function which clears the selected courses label, select_lbl"""
         self.selectedc.clear()
         self.select_lbl.setText("Selected Courses: ")
         self.select_lbl.adjustSize()
+        self.speculate()
+
+    def get_session(self) -> object:
+        """Function which returns the SearchSession that keeps the timetables found so far, creating it the first time
+        it is needed"""
+        if self.session is None:
+            from tree_computations import SearchSession
+            self.session = SearchSession()
+        return self.session
+
+    def unknown_courses(self) -> list[str]:
+        """Function which returns the selected courses that aren't in the course list (such as an empty or mistyped
+        code) in sorted order, since no search should be started for them"""
+        return sorted(self.selectedc - self.known_courses)
+
+    def chosen_ranks(self) -> Optional[list[int]]:
+        """Function which returns the user's ranking of the scores as used by get_ttables_ranked, or None if two
+        preferences have the same rank"""
+        ranks = [0, 0, 0]
+        for score, combobox in enumerate((self.rank1, self.rank2, self.rank3)):
+            ranks[int(combobox.currentText()) - 1] = score
+        return ranks if sorted(ranks) == [0, 1, 2] else None
+
+    def speculate(self) -> None:
+        """Function which starts searching for the selected courses in the background as soon as they change, so that
+        submitting them is often immediate. The timetables found are kept in the session, and a search for courses
+        that are no longer selected is cancelled."""
+        wanted, ranks = set(self.selectedc), self.chosen_ranks() or [0, 1, 2]
+        if self.speculation is not None:
+            if self.speculation.isRunning() and (self.speculation.wanted, self.speculation.ranks) == (wanted, ranks):
+                return None
+            self.speculation.cancel()
+            self.speculation = None
+        if not wanted or self.unknown_courses() or self.get_session().lookup(wanted, ranks) is not None:
+            return None
+
+        self.speculation = TimetableWorker(self.get_session(), wanted, ranks, self)
+        self.speculation.progressed.connect(self.search_progressed)
+        self.speculation.found.connect(self.search_finished)
+        self.speculation.start()
+        return None
 
     def submit_courses(self) -> None:
         """Function that sends the chosen courses and preferences to the backend"""
@@ -150,24 +279,180 @@ class Program(QWidget):
 
             return None
 
-        elif (self.rank3.currentText() == self.rank2.currentText()
-              or self.rank1.currentText() == self.rank3.currentText()
-              or self.rank1.currentText() == self.rank2.currentText()):
-            self.err_lbl.setText('Please rank preferences with no repeating ranks')
+        elif self.unknown_courses():
+            self.err_lbl.setText(f"'{self.unknown_courses()[0]}' is not a course, please clear the courses and "
+                                 "try again")
             self.err_lbl.adjustSize()
 
             return None
 
-        self.ttables = get_ttables_ranked(self.selectedc, self.pref_rank)
-        if not self.ttables:
-            self.err_lbl.setText('These courses conflict with each other, please try again')
+        elif self.chosen_ranks() is None:
+            self.err_lbl.setText('Please rank preferences with no repeating ranks')
             self.err_lbl.adjustSize()
 
             return None
 
-        self.pref_rank[int(self.rank1.currentText()) - 1] = 0
-        self.pref_rank[int(self.rank2.currentText()) - 1] = 1
-        self.pref_rank[int(self.rank3.currentText()) - 1] = 2
+        self.pref_rank = self.chosen_ranks()
+
+        if self.worker is not None and self.worker.isRunning():
+            if not self.worker.cancelled:
+                return None
+            self.worker.wait()
+
+        # Counting the timetables is quick, so a course set with none is reported without running the search
+        from tree_computations import count_ttables
+        self.total = count_ttables(set(self.selectedc))
+        if not self.total:
+            self.status_lbl.setText('')
+            self.show_conflicts(set(self.selectedc))
+            return None
+
+        self.err_lbl.setText('')
+        self.subbtn.setEnabled(False)
+        self.cancelbtn.show()
+        self.status_lbl.setText(f'Searching {self.total:,} possible timetables...')
+        self.status_lbl.adjustSize()
+
+        # A search already running in the background for the same courses and ranks is shown instead of restarted
+        speculation = self.speculation
+        self.speculation = None
+        if (speculation is not None and speculation.isRunning()
+                and (speculation.wanted, speculation.ranks) == (set(self.selectedc), self.pref_rank)):
+            self.worker = speculation
+            return None
+        elif speculation is not None:
+            speculation.cancel()
+
+        self.worker = TimetableWorker(self.get_session(), set(self.selectedc), list(self.pref_rank), self)
+        self.worker.progressed.connect(self.search_progressed)
+        self.worker.found.connect(self.search_finished)
+        self.worker.start()
+
+        return None
+
+    def search_progressed(self, nodes: int, scored: int, ttables: list) -> None:
+        """Function which shows the progress of the search and lets the user start browsing the best timetables
+        found so far"""
+        if self.sender() is not self.worker or self.worker.cancelled:
+            return None
+
+        self.status_lbl.setText(f'Searching {self.total:,} possible timetables... {nodes} partial timetables '
+                                f'explored, {scored} timetables scored')
+        self.status_lbl.adjustSize()
+        if ttables:
+            shown = _timetable_key(self.ttables[self.index]) if self.browsing else None
+            self.ttables = ttables
+            if not self.browsing:
+                self.show_results()
+            else:
+                # The timetable being viewed can move or be replaced, so it is shown again if it changed
+                self.index = min(self.index, len(ttables) - 1)
+                if _timetable_key(ttables[self.index]) != shown:
+                    self.show_timetable()
+                else:
+                    self.update_nav()
+
+        return None
+
+    def search_finished(self, ttables: list) -> None:
+        """Function which shows the final timetables once the search is done"""
+        if self.sender() is not self.worker or self.worker.cancelled:
+            return None
+
+        self.cancelbtn.hide()
+        if not ttables:
+            self.subbtn.setEnabled(True)
+            self.status_lbl.setText('')
+            self.show_conflicts(self.worker.wanted)
+
+            return None
+
+        if self.worker.stats is not None:
+            self.status_lbl.setText(f'Done, showing the best {len(ttables)} timetables ({self.worker.stats.summary()})')
+        else:
+            self.status_lbl.setText(f'Done, showing the best {len(ttables)} timetables (found earlier)')
+        self.status_lbl.adjustSize()
+        self.ttables = ttables
+        if self.browsing:
+            self.index = min(self.index, len(ttables) - 1)
+            self.show_timetable()
+        else:
+            self.show_results()
+
+        if self.reranker is None:
+            self.reranker = CandidatesWorker(self.get_session(), self.worker.wanted, self)
+            self.reranker.found.connect(self.candidates_found)
+            self.reranker.start()
+
+        return None
+
+    def candidates_found(self, candidates: object) -> None:
+        """Function which keeps the timetables found under every ranking, so that changing the preferences only
+        sorts them"""
+        if self.sender() is self.reranker:
+            self.candidates = candidates
+
+    def change_preferences(self, choice: int) -> None:
+        """Function of the preferences combobox on the results screen which ranks the timetables again, by sorting
+        the timetables kept for every ranking if they are ready, or by searching again otherwise"""
+        from tree_computations import ALL_RANKS
+        ranks = ALL_RANKS[choice]
+        if ranks == self.pref_rank:
+            return None
+        self.pref_rank = ranks
+        self.index = 0
+
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+        if self.candidates is not None:
+            # A search for an earlier choice must not replace the timetables sorted for this one when it ends
+            self.worker = None
+            self.cancelbtn.hide()
+            self.ttables = self.candidates.ranked(ranks)
+            self.status_lbl.setText(f'Ranked again without searching, showing the best {len(self.ttables)} timetables')
+            self.status_lbl.adjustSize()
+            self.show_timetable()
+            return None
+
+        self.cancelbtn.show()
+        self.status_lbl.setText('Searching...')
+        self.status_lbl.adjustSize()
+        if self.browsing and self.ttables:
+            # The view is reset to the first timetable so it matches self.index until the new search reports back
+            self.show_timetable()
+        self.worker = TimetableWorker(self.get_session(), self.worker.wanted, ranks, self)
+        self.worker.progressed.connect(self.search_progressed)
+        self.worker.found.connect(self.search_finished)
+        self.worker.start()
+        return None
+
+    def show_conflicts(self, wanted: set[str]) -> None:
+        """Function which tells the user that the wanted courses have no timetable, naming two of them that conflict
+        if there are any"""
+        from tree_computations import find_conflicting_courses
+        conflicts = find_conflicting_courses(wanted)
+        if conflicts:
+            self.err_lbl.setText(f'{conflicts[0][0]} and {conflicts[0][1]} conflict with each other, please try again')
+        else:
+            self.err_lbl.setText('These courses conflict with each other, please try again')
+        self.err_lbl.adjustSize()
+
+    def cancel_search(self) -> None:
+        """Function of the cancel button which stops the search, keeping any timetables found so far"""
+        if self.worker is not None:
+            self.worker.cancel()
+        self.cancelbtn.hide()
+        if self.browsing:
+            self.status_lbl.setText(f'Search cancelled, showing the best {len(self.ttables)} timetables found')
+        else:
+            self.subbtn.setEnabled(True)
+            self.status_lbl.setText('Search cancelled')
+        self.status_lbl.adjustSize()
+
+    def show_results(self) -> None:
+        """Function which replaces the course selection widgets with the first timetable"""
+        self.browsing = True
+        self.index = 0
 
         self.desc.deleteLater()
         self.cb.deleteLater()
@@ -183,26 +468,33 @@ class Program(QWidget):
         self.late.deleteLater()
         self.subbtn.deleteLater()
         self.err_lbl.deleteLater()
+        self.status_lbl.move(int(1920 * .008), int(1080 * .06))
+        self.cancelbtn.move(int(1920 * .38), int(1080 * .001))
+        self.cancelbtn.resize(int(1920 * .05), int(1080 * .05))
+
+        self.exportbtn = QPushButton(self)
+        self.exportbtn.setText("Export")
+        self.exportbtn.move(int(1920 * .32), int(1080 * .001))
+        self.exportbtn.resize(int(1920 * .05), int(1080 * .05))
+        self.exportbtn.setStyleSheet("background-color: lightgray")
+        self.exportbtn.clicked.connect(self.export_timetable)
+        self.exportbtn.show()
 
-        self.show_timetable()
-
-        return None
-
-    def show_timetable(self) -> None:
-        """Generates and displays a timetable"""
-        self.title.setText(f"Timetable {str(self.index + 1)}/{len(self.ttables)}")
         self.title.move(int(1920 * .2), int(1080 * .001))
 
-        self.view = QWebEngineView()
+        from tree_computations import ALL_RANKS
+        names = ('Distance', 'Early classes', 'Late classes')
+        self.pref_cb = QComboBox(self)
+        self.pref_cb.addItems([' > '.join(names[score] for score in ranks) for ranks in ALL_RANKS])
+        self.pref_cb.setCurrentIndex(ALL_RANKS.index(self.pref_rank))
+        self.pref_cb.move(int(1920 * .51), int(1080 * .01))
+        self.pref_cb.currentIndexChanged.connect(self.change_preferences)
+        self.pref_cb.show()
 
         self.next = QPushButton(self)
         self.next.setText("Next")
         self.next.move(int(1920 * .45), int(1080 * .001))
         self.next.resize(int(1920 * .05), int(1080 * .05))
-        if self.index < len(self.ttables) - 1:
-            self.next.setStyleSheet("background-color: green")
-        else:
-            self.next.setStyleSheet("background-color: lightgray")
         self.next.clicked.connect(self.press_next)
         self.next.show()
 
@@ -210,20 +502,72 @@ class Program(QWidget):
         self.prev.setText("Prev")
         self.prev.move(int(1920 * .008), int(1080 * .001))
         self.prev.resize(int(1920 * .05), int(1080 * .05))
+        self.prev.clicked.connect(self.press_prev)
+        self.prev.show()
+
+        # QtWebEngine takes a while to load, so it is only imported once the first timetable is shown
+        from PyQt5.QtWebEngineWidgets import QWebEngineView
+        self.view = QWebEngineView()
+        self.view.resize(700, 500)
+
+        self.show_timetable()
+
+    def update_nav(self) -> None:
+        """Updates the title and the next and prev buttons for the timetable being viewed"""
+        self.title.setText(f"Timetable {str(self.index + 1)}/{len(self.ttables)}")
+        if self.index < len(self.ttables) - 1:
+            self.next.setStyleSheet("background-color: green")
+        else:
+            self.next.setStyleSheet("background-color: lightgray")
         if self.index > 0:
             self.prev.setStyleSheet("background-color: green")
         else:
             self.prev.setStyleSheet("background-color: lightgray")
-        self.prev.clicked.connect(self.press_prev)
-        self.prev.show()
-
-        make_timetable(self.ttables[self.index])
-        with open('timetable.htm', 'r') as f:
-            html = f.read()
-            self.view.setHtml(html)
 
-        self.view.resize(700, 500)
+    def show_timetable(self) -> None:
+        """Displays the timetable at self.index in the web view, then prefetches its neighbours once the GUI is idle"""
+        self.update_nav()
+        self.view.setHtml(self.timetable_html(self.index))
         self.view.show()
+        QTimer.singleShot(0, self.prefetch_neighbours)
+
+    def timetable_html(self, index: int) -> str:
+        """Returns the HTML of the timetable at index, which is only rendered if it isn't in the cache of the
+        HTML_CACHE_SIZE most recently used timetables. Timetables are cached by their sections, so the cache stays
+        valid when the search finds new timetables."""
+        ttable = self.ttables[index]
+        key = _timetable_key(ttable)
+        if key in self.html_cache:
+            self.html_cache.move_to_end(key)
+        else:
+            from table_visualization import render_timetable
+            self.html_cache[key] = render_timetable(ttable)
+            if len(self.html_cache) > HTML_CACHE_SIZE:
+                self.html_cache.popitem(last=False)
+        return self.html_cache[key]
+
+    def prefetch_neighbours(self) -> None:
+        """Renders the timetables before and after the one being viewed, so that next and prev are instant"""
+        for index in (self.index + 1, self.index - 1):
+            if 0 <= index < len(self.ttables):
+                self.timetable_html(index)
+
+    def export_timetable(self) -> None:
+        """Method of the export button which saves the timetable being viewed as an Excel spreadsheet"""
+        from table_visualization import make_timetable
+        make_timetable(self.ttables[self.index], 'timetable.xlsx')
+        self.status_lbl.setText(f'Saved timetable {self.index + 1} to timetable.xlsx')
+        self.status_lbl.adjustSize()
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        """Stops any running search and closes the timetable view before the window closes"""
+        for worker in (self.worker, self.speculation, self.reranker):
+            if worker is not None and worker.isRunning():
+                worker.cancel()
+                worker.wait()
+        if self.browsing:
+            self.view.close()
+        QWidget.closeEvent(self, event)
 
     def press_next(self) -> None:
         """Method of the next button when viewing timetables which shows the next timetable to user
@@ -231,7 +575,6 @@ class Program(QWidget):
         - 0 <= self.index <= len(self.ttables)
         """
         if self.index < len(self.ttables) - 1:
-            self.view.close()
             self.index += 1
             self.show_timetable()
 
@@ -241,11 +584,15 @@ class Program(QWidget):
         - 0 <= self.index <= len(self.ttables)
         """
         if self.index > 0:
-            self.view.close()
             self.index -= 1
             self.show_timetable()
 
 
+def _timetable_key(ttable: list) -> tuple[tuple[str, str], ...]:
+    """Returns the course and section code of each section of a timetable, which identify it"""
+    return tuple((section.course, section.sect) for section in ttable)
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod(verbose=True)
@@ -15,19 +15,77 @@ please consult our Course Syllabus.
 This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
 """
 
+import time
+
+# Taken before the other imports, so that the startup time includes importing Qt and the course selection screen
+STARTED = time.perf_counter()
+
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from gui_class import Program
 from parse_functions import parse_course_options
 import sys
 
+STARTUP_BUDGET = 1.0  # The longest the window should take to become interactive, in seconds
+
+
+class StartupTimer:
+    """Records how long each phase of startup takes, from the given start time (STARTED, before the modules imported
+    at the top of this file, which only include the parts of the application that the course selection screen needs).
+
+    Instance Attributes:
+    - start: The time (from time.perf_counter) startup began
+    - phases: The name and duration (in seconds) of each phase so far, in order
+    """
+    start: float
+    phases: list[tuple[str, float]]
+    _last: float
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.phases = []
+        self._last = self.start
+
+    def lap(self, name: str) -> None:
+        """Record that the phase with the given name has just finished."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def total(self) -> float:
+        """Return the time taken by all the phases so far."""
+        return self._last - self.start
+
+    def summary(self) -> str:
+        """Return a one-line summary of the phases and the total time, compared to STARTUP_BUDGET."""
+        phases = ', '.join(f'{name} {duration * 1000:.0f}ms' for name, duration in self.phases)
+        return f'startup: {phases}; interactive after {self.total() * 1000:.0f}ms ' \
+               f'(budget {STARTUP_BUDGET * 1000:.0f}ms)'
+
+
+def report_startup(timer: StartupTimer) -> None:
+    """Called once the event loop is running and the window can be used. Prints the startup timings if --timings was
+    given or the startup took longer than STARTUP_BUDGET."""
+    timer.lap('first paint')
+    if '--timings' in sys.argv or timer.total() > STARTUP_BUDGET:
+        print(timer.summary(), file=sys.stderr)
+
+
 if __name__ == "__main__":
+    timer = StartupTimer(STARTED)
+    timer.lap('imports')
     if hasattr(Qt, 'AA_EnableHighDpiScaling'):
         QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     if hasattr(Qt, 'AA_UseHighDpiPixmaps'):
         QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
+    # Lets QtWebEngine be imported after the application is created, when the first timetable is shown
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts, True)
     course_options = parse_course_options()
+    timer.lap('course list')
     app = QApplication(sys.argv)
+    timer.lap('application')
     widget = Program(course_options)
     widget.show()
+    timer.lap('window')
+    QTimer.singleShot(0, lambda: report_startup(timer))
     sys.exit(app.exec())
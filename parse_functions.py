@@ -14,25 +14,48 @@ expressly prohibited.
 
 This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
 """
+import json
+import os
+import sys
 from math import radians
-from schedule_tree import SectInfo
+from schedule_tree import SectInfo, share
 
+COURSE_CSV = "data/course_info.csv"
+COURSE_INDEX = "data/course_info.idx"
 
-def parse_coordinates(start: str, end: str) -> list[float]:
+# The course index of the current version of COURSE_CSV (see load_course_index), and the parsed sections of every
+# course that has been requested from it so far
+_course_index = {'version': None, 'courses': {}}
+_parsed_sections = {}
+
+
+def parse_buildings() -> dict[str, tuple[float, float]]:
     """
-    A function that parses "building_info.csv" to get the latitudes and longitudes (in radians) of the start and end
-    locations that are provided as arguments.
+    A function that parses "building_info.csv" to get a mapping from every building code to the latitude and longitude
+    (in radians) of that building. If a building code appears more than once, its first row is used.
     """
-    coordinates = []
+    buildings = {}
     with open("data/building_info.csv", "r") as file:
         for row in file:
-            if row[:2] in (start, end):
-                cols = row.strip().split('|')
-                coordinates.append(radians(float(cols[1])))
-                coordinates.append(radians(float(cols[2])))
-            if len(coordinates) == 4:
-                return coordinates
-    return [0, 0, 0, 0]
+            cols = row.strip().split('|')
+            if cols[0] not in buildings:
+                buildings[cols[0]] = (radians(float(cols[1])), radians(float(cols[2])))
+    return buildings
+
+
+def parse_course_buildings() -> set[str]:
+    """
+    A function that returns the set of every building code used by a lecture room in course_info.csv.
+    """
+    codes = set()
+    with open(COURSE_CSV, "r") as file:
+        for row in file:
+            for day in row.strip().split("|")[3].split("!"):
+                if day == '###':
+                    continue
+                for lecture in day.split('+'):
+                    codes.update(room.split()[0] for room in lecture.split('$')[0].split(';'))
+    return codes
 
 
 def parse_course_csv(wanted: set[str]) -> dict[str, list[SectInfo]]:
@@ -40,50 +63,112 @@ def parse_course_csv(wanted: set[str]) -> dict[str, list[SectInfo]]:
     A function that parses course_info.csv in order to obtain information about each course in the wanted list. A
     mapping from course code to a list of SectInfo objects, each of which contains information such as section code,
     course code, instructors, etc. for a section that corresponds to the course code key, is returned.
+
+    Only the rows of the wanted courses are read, using the byte ranges from load_course_index, and the sections of
+    each course are only parsed the first time it is wanted.
     """
-    course_dict = {crs: [] for crs in wanted}
-    with open("data/course_info.csv", "r") as file:
-        for row in file:
-            if row[:10] not in wanted:
-                continue
-            cols = row.strip().split("|")
-            course_code = cols[0]
-            section_code = cols[1]
-            instructors = cols[2]
-
-            days = cols[3].split("!")
-            room_times = {'Mon': days[0], 'Tue': days[1], 'Wed': days[2], 'Thu': days[3], 'Fri': days[4]}
-            for day in room_times:
-                if room_times[day] == '###':
-                    room_times[day] = []
-                    continue
-                room_times[day] = room_times[day].split('+')
-                for i in range(len(room_times[day])):
-                    room_times[day][i] = room_times[day][i].split('$')
-                    room_times[day][i][0] = tuple(room_times[day][i][0].split(';'))
+    index = load_course_index()
+    missing = [crs for crs in wanted if crs not in _parsed_sections]
+    if missing:
+        with open(COURSE_CSV, "rb") as file:
+            for crs in missing:
+                sections = []
+                for offset, length in index.get(crs, []):
+                    file.seek(offset)
+                    sections.extend(_parse_section_row(row) for row in file.read(length).decode().splitlines())
+                _parsed_sections[crs] = sections
 
-                    room_times[day][i][1] = room_times[day][i][1].split('~')
-                    room_times[day][i][1][0] = [int(j) for j in room_times[day][i][1][0].split(':')]
-                    room_times[day][i][1][0] = room_times[day][i][1][0][0] + room_times[day][i][1][0][1] / 60
-                    room_times[day][i][1][1] = [int(j) for j in room_times[day][i][1][1].split(':')]
-                    room_times[day][i][1][1] = room_times[day][i][1][1][0] + room_times[day][i][1][1][1] / 60
+    return {crs: list(_parsed_sections[crs]) for crs in wanted}
 
-                    room_times[day][i][1] = tuple(room_times[day][i][1])
 
-            course_dict[course_code].append(SectInfo(section_code, course_code, instructors, room_times))
+def clear_parsed_courses() -> None:
+    """
+    A function that forgets every course parsed by parse_course_csv so far, so that they are parsed again the next
+    time they are wanted (for example, to measure how long parsing takes).
+    """
+    _parsed_sections.clear()
+
 
-    return course_dict
+def _parse_section_row(row: str) -> SectInfo:
+    """
+    A helper function for parse_course_csv that parses a single row of course_info.csv into a SectInfo object.
+    """
+    cols = row.strip().split("|")
+    course_code, section_code, instructors = (sys.intern(col) for col in cols[:3])
+
+    days = cols[3].split("!")
+    room_times = {'Mon': days[0], 'Tue': days[1], 'Wed': days[2], 'Thu': days[3], 'Fri': days[4]}
+    for day in room_times:
+        if room_times[day] == '###':
+            room_times[day] = ()
+            continue
+        lectures = []
+        for lecture in room_times[day].split('+'):
+            rooms, times = lecture.split('$')
+            start, end = ([int(j) for j in time.split(':')] for time in times.split('~'))
+            lectures.append(share((share(tuple(sys.intern(room) for room in rooms.split(';'))),
+                                   share((start[0] + start[1] / 60, end[0] + end[1] / 60)))))
+        room_times[day] = share(tuple(lectures))
+
+    return SectInfo(section_code, course_code, instructors, room_times)
+
+
+def load_course_index() -> dict[str, list[list[int]]]:
+    """
+    A function that returns a mapping from every course code in course_info.csv to the byte ranges (as [offset,
+    length] pairs) of its rows. The index is saved to course_info.idx next to the data, together with the size and
+    modification time of course_info.csv, so it is only rebuilt when the data changes. Changing the data also clears
+    the sections already parsed by parse_course_csv.
+    """
+    stat = os.stat(COURSE_CSV)
+    version = [stat.st_size, stat.st_mtime_ns]
+    if _course_index['version'] == version:
+        return _course_index['courses']
+
+    try:
+        with open(COURSE_INDEX, "r") as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        saved = {}
+
+    if saved.get('version') == version:
+        courses = saved['courses']
+    else:
+        courses = _build_course_index()
+        try:
+            with open(COURSE_INDEX, "w") as file:
+                json.dump({'version': version, 'courses': courses}, file)
+        except OSError:
+            pass  # The index still works without being saved, it just has to be rebuilt next time
+
+    _course_index['version'], _course_index['courses'] = version, courses
+    _parsed_sections.clear()
+    return courses
+
+
+def _build_course_index() -> dict[str, list[list[int]]]:
+    """
+    A helper function for load_course_index that scans course_info.csv for the byte ranges of the rows of each course.
+    Consecutive rows of the same course are merged into one range.
+    """
+    courses = {}
+    offset = 0
+    with open(COURSE_CSV, "rb") as file:
+        for row in file:
+            ranges = courses.setdefault(row[:10].decode(), [])
+            if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+                ranges[-1][1] += len(row)
+            else:
+                ranges.append([offset, len(row)])
+            offset += len(row)
+    return courses
 
 
 def parse_course_options() -> list[str]:
     """
     A function that returns a list of every unique course code in course_info.csv.
     """
-    with open("data/course_info.csv", "r") as file:
-        course_options = {row[:10] for row in file}
-        course_options = list(course_options)
-        course_options.sort()
-    return course_options
+    return sorted(load_course_index())
 
 
 if __name__ == '__main__':
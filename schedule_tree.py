@@ -14,26 +14,73 @@ expressly prohibited.
 This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
 """
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Optional
+import random
+import sys
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Hashable, Iterator, Optional
 
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri')
+SLOTS_PER_HOUR = 6  # 10-minute slots
+SLOTS_PER_DAY = 24 * SLOTS_PER_HOUR
+# The semesters (0 for fall, 1 for winter) that a course occupies, keyed by the last character of its course code
+SEMESTERS = {'F': (0,), 'S': (1,), 'Y': (0, 1)}
 
-@dataclass
+# Every distinct tuple and CompiledSection shared between sections so far (see share)
+_shared = {}
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledSection:
+    """A compact record of everything the search and the scoring need to know about a section, compiled once when
+    the section is created so that it never has to be recomputed for each candidate timetable.
+    Instance Attributes:
+    - occupancy: A bitmask of the 10-minute slots this section occupies, with one block of SLOTS_PER_DAY bits for each
+                semester and day of the week
+    - morning: The number of morning classes (starting before 10) the section adds to a timetable
+    - evening: The number of evening classes (ending after 17) the section adds to a timetable
+    - num_lectures: The number of lectures the section adds to a timetable
+    - days: A (sem * len(DAYS) + day, lectures) pair for every semester and day on which the section has lectures,
+                in order, where lectures is a tuple of (start, end, building code) tuples sorted by start time
+
+    The counts follow the scores, so the lectures of a year-long course count once for each semester.
+
+    Representation Invariants:
+    - self.occupancy > 0 or self.days == ()
+    - self.num_lectures == sum(len(lectures) for _, lectures in self.days)
+    """
+    occupancy: int
+    morning: int
+    evening: int
+    num_lectures: int
+    days: tuple[tuple[int, tuple[tuple[float, float, str], ...]], ...]
+
+
+@dataclass(slots=True)
 class SectInfo:
     """A dataclass that contains all the necessary information for a section.
     Instance Attributes:
     - sect: A string representation of the section code
     - course: A string representation of the course code
     - instructors: A string containing all the instructors for the section
-    - room_times: A dictionary that maps days of the week to a list of lists, with each sublist (which represnts a
-                lecture) containing two tuples, the first containing a string of the lecture room number (or two strings
-                for first and second semester room numbers, if the is year-long) and the second containing 2 floats to
-                represent the start and end times of the lecture.
+    - room_times: A dictionary that maps days of the week to a tuple of lectures, each of which is a tuple containing
+                two tuples, the first containing a string of the lecture room number (or two strings for first and
+                second semester room numbers, if the is year-long) and the second containing 2 floats to represent the
+                start and end times of the lecture.
+    - occupancy: The occupancy bitmask of the section (see CompiledSection), kept here as well since the search checks
+                it far more often than anything else
+    - compiled: The CompiledSection of the section, compiled once from room_times when the section is created
     """
     sect: str
     course: str
     instructors: str
-    room_times: dict[str, list[list[tuple[str], tuple[float]]]]
+    room_times: dict[str, tuple[tuple[tuple[str, ...], tuple[float, float]], ...]]
+    occupancy: int = field(init=False, repr=False, compare=False)
+    compiled: CompiledSection = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.compiled = compile_section(self.course, self.room_times)
+        self.occupancy = self.compiled.occupancy
 
 
 class Schedule:
@@ -58,31 +105,26 @@ class Schedule:
         self.info = sect_info
         self.sub_courses = []
 
-    def add_sections(self, course_dict: dict[str, list[SectInfo]], course_names: list[str], prev_times: dict) -> None:
+    def add_sections(self, course_dict: dict[str, list[SectInfo]], course_names: list[str], occupied: int) -> None:
         """
         A recursive method that adds all the sections of a course in course_dict as sub_courses while ensuring each
         section does not conflict with any of the times from its ancestor sections. Before adding the newly created
         tree for each section to this trees sub_courses list, a recursive call is made on the newly created tree,
-        passing in course_dict, the remaining courses to be added, and the dictionary of lecture times for this new
-        tree's ancestor section, to populate its own sub_courses list. Does not do anything if there are no more courses
+        passing in course_dict, the remaining courses to be added, and the occupancy bitmask of this new tree's
+        ancestor sections, to populate its own sub_courses list. Does not do anything if there are no more courses
         left to be added in course_names.
 
         Preconditions:
         - course_dict != {}
         - course_names != []
-        - prev_times != {}
+        - occupied >= 0
         - all(lec.course == section for section in course_dict for lec in course_dict[section])
         """
         if course_names:
-            sections = course_dict[course_names[0]]  # list[SectInfo]
-            for section_info in sections:  # Each SectInfo object (should be turned into subtrees)
-                sinfo_dict = section_info.room_times  # The rooms and times for the section
-                times_dict = {day: [session[1] for session in sinfo_dict[day]]
-                              for day in sinfo_dict}  # Just the times
-                if not check_conflict(prev_times, times_dict):  # Check if conflict with any prev ones
-                    new_prev = {day: prev_times[day] + times_dict[day] for day in sinfo_dict}
+            for section_info in course_dict[course_names[0]]:
+                if not check_conflict(occupied, section_info.occupancy):  # Check if conflict with any prev ones
                     new_tree = Schedule(section_info)
-                    new_tree.add_sections(course_dict, course_names[1:], new_prev)
+                    new_tree.add_sections(course_dict, course_names[1:], occupied | section_info.occupancy)
                     self.sub_courses.append(new_tree)
 
     def accumulate_ttables(self) -> list[list[SectInfo]]:
@@ -109,26 +151,283 @@ class Schedule:
         return paths
 
 
-def check_conflict(day_time_1: dict[str, list[tuple[float, float]]],
-                   day_time_2: dict[str, list[tuple[float, float]]]) -> bool:
+def iter_ttables(course_dict: dict[str, list[SectInfo]], course_names: list[str],
+                 occupied: int = 0, prefix: Optional[list[SectInfo]] = None) -> Iterator[list[SectInfo]]:
+    """
+    A generator that lazily yields every complete timetable (a list of one section for each course in course_names, in
+    the same order) whose sections do not conflict with each other or with the occupied bitmask. Unlike building a
+    Schedule tree and calling accumulate_ttables, only the current path through the search is kept in memory, and
+    partial paths that dead-end are never produced. The timetables are yielded in the same order as the paths
+    returned by accumulate_ttables.
+
+    Preconditions:
+    - all(name in course_dict for name in course_names)
+    - occupied >= 0
+    """
+    if prefix is None:
+        prefix = []
+    if not course_names:
+        if prefix:
+            yield prefix
+        return
+    for section_info in course_dict[course_names[0]]:
+        if not check_conflict(occupied, section_info.occupancy):
+            yield from iter_ttables(course_dict, course_names[1:], occupied | section_info.occupancy,
+                                    prefix + [section_info])
+
+
+def group_sections(sections: list[SectInfo], by_building: bool = True) -> list[list[SectInfo]]:
+    """
+    Return the sections grouped into classes of sections that have the same lecture times on every day (and, if
+    by_building is True, the same buildings for each lecture), so that they differ only in their instructors or
+    section codes. Every section in a class conflicts with exactly the same sections and, if by_building is True, gives
+    any timetable exactly the same scores. The classes are in the order of their first section, and the sections in
+    each class keep their order in sections.
+    """
+    classes = {}
+    for section_info in sections:
+        classes.setdefault(time_signature(section_info, by_building), []).append(section_info)
+    return list(classes.values())
+
+
+def time_signature(section_info: SectInfo, by_building: bool = True) -> tuple:
+    """
+    Return a hashable summary of the lecture times of a section on each day, which also includes the building code of
+    each lecture if by_building is True.
+    """
+    if by_building:
+        return section_info.compiled.days
+    return tuple((d, tuple(lecture[:2] for lecture in lectures)) for d, lectures in section_info.compiled.days)
+
+
+class CompatibilityMatrix:
+    """The pairwise compatibility of the sections of a set of courses, computed once so that a search never has to
+    check the same pair of sections for a conflict twice.
+
+    The sections of each course are numbered by their positions in course_dict, and a set of sections of a course is
+    represented as an int bitset with bit a set if the section at position a is in it. Intersecting the bitsets of the
+    sections chosen so far gives the sections of another course that fit with all of them.
+
+    Instance Attributes:
+    - course_names: The courses, in order
+    - full: For each course in order, the bitset of all its sections
+    - masks: For each course i in order and each of its sections a, masks[i][a][k] is the bitset of the sections of
+             course k that do not conflict with section a (with masks[i][a][i] == 0)
+    - checks: The number of pairs of sections of different courses that were checked for a conflict
+    - conflicts: The number of those pairs that conflict
+
+    Representation Invariants:
+    - len(self.course_names) == len(self.full) == len(self.masks)
+    """
+    course_names: list[str]
+    full: list[int]
+    masks: list[list[list[int]]]
+    checks: int
+    conflicts: int
+
+    def __init__(self, course_dict: dict[str, list[SectInfo]], course_names: list[str]) -> None:
+        self.course_names = course_names
+        occupancies = [[section_info.occupancy for section_info in course_dict[name]] for name in course_names]
+        self.full = [(1 << len(course)) - 1 for course in occupancies]
+        self.masks = [[[0 if k == i else sum(1 << b for b, other in enumerate(occupancies[k])
+                                             if not check_conflict(occupancy, other))
+                        for k in range(len(course_names))]
+                       for occupancy in occupancies[i]]
+                      for i in range(len(course_names))]
+        self.checks = sum(len(occupancies[i]) * len(occupancies[k])
+                          for i in range(len(course_names)) for k in range(len(course_names)) if k != i)
+        self.conflicts = self.checks - sum(mask.bit_count() for course in self.masks for row in course for mask in row)
+
+    def conflicting_courses(self) -> list[tuple[str, str]]:
+        """Return every pair of courses (in order) that can never be taken together, because each section of the first
+        course conflicts with every section of the second."""
+        return [(self.course_names[i], self.course_names[k])
+                for i in range(len(self.course_names)) for k in range(i + 1, len(self.course_names))
+                if not any(masks[k] for masks in self.masks[i])]
+
+
+class TimetableDAG:
+    """The conflict-free timetables of a set of courses, counted and sampled without enumerating them.
+
+    Building a Schedule tree rebuilds the same subtree under every parent that leaves the same sections free for the
+    remaining courses. Here the subtrees are shared instead, as the nodes of a directed acyclic graph: a node is a
+    course (by level, the order in which courses are chosen) together with the part of the occupied bitmask that the
+    sections of that course and the later ones could overlap, and the number of ways of completing each node is
+    computed once and memoized. Year-long courses are chosen first, then fall courses and then winter courses, so once
+    the fall courses are chosen every path through the graph meets at the same node for the first winter course.
+
+    Sections with the same lecture times conflict with exactly the same sections, so each node only branches once for
+    each such class of sections and multiplies the count by the size of the class.
+
+    Instance Attributes:
+    - course_names: The courses, in the order of the timetables returned by sample
+    - order: The index in course_names of the course at each level
+    - classes: For each level, the occupancy bitmask and the sections of each class of sections of its course
+    - reach: For each level, the combined occupancy of every section of the courses at that level and after it
+    - counts: The number of ways of completing each node visited so far, keyed by (level, occupancy)
+
+    Representation Invariants:
+    - len(self.order) == len(self.classes) == len(self.reach) == len(self.course_names)
+    - all(occupancy & ~self.reach[level] == 0 for level, occupancy in self.counts)
+    """
+    course_names: list[str]
+    order: list[int]
+    classes: list[list[tuple[int, list[SectInfo]]]]
+    reach: list[int]
+    counts: dict[tuple[int, int], int]
+
+    def __init__(self, course_dict: dict[str, list[SectInfo]], course_names: list[str]) -> None:
+        self.course_names = course_names
+        # Courses without a known suffix (which have no sections) come first, so that counting stops at once
+        self.order = sorted(range(len(course_names)), key=lambda i: ('YFS'.find(course_names[i][-1:]), i))
+        self.classes = [[(group[0].occupancy, group) for group in group_sections(course_dict[course_names[i]], False)]
+                        for i in self.order]
+        self.reach = [0] * len(self.order)
+        reach = 0
+        for level in reversed(range(len(self.order))):
+            for occupancy, _ in self.classes[level]:
+                reach |= occupancy
+            self.reach[level] = reach
+        self.counts = {}
+
+    def count(self) -> int:
+        """Return the number of conflict-free timetables, which is 0 if there are no courses or if a course has no
+        sections (for example, because its code is malformed).
+
+        >>> TimetableDAG({}, []).count()
+        0
+        >>> TimetableDAG({'csc108': [], '': []}, ['csc108', '']).count()
+        0
+        """
+        return self._count(0, 0) if self.order else 0
+
+    def sample(self, rng: random.Random) -> list[SectInfo]:
+        """Return a conflict-free timetable (with one section for each course, in the order of course_names) chosen
+        uniformly at random from all of them, using rng.
+
+        Preconditions:
+        - self.count() > 0
+        """
+        ttable = [None] * len(self.order)
+        occupied = 0
+        for level, i in enumerate(self.order):
+            occupied &= self.reach[level]
+            pick = rng.randrange(self._count(level, occupied))
+            for occupancy, sections in self.classes[level]:
+                if not check_conflict(occupied, occupancy):
+                    completions = self._count(level + 1, occupied | occupancy)
+                    if pick < len(sections) * completions:
+                        ttable[i] = sections[pick // completions]
+                        occupied |= occupancy
+                        break
+                    pick -= len(sections) * completions
+        return ttable
+
+    def _count(self, level: int, occupied: int) -> int:
+        """Return the number of ways of choosing a section for the course at level and every later course that do not
+        conflict with each other or with occupied."""
+        if level == len(self.order):
+            return 1
+        key = (level, occupied & self.reach[level])
+        if key not in self.counts:
+            self.counts[key] = sum(len(sections) * self._count(level + 1, key[1] | occupancy)
+                                   for occupancy, sections in self.classes[level]
+                                   if not check_conflict(key[1], occupancy))
+        return self.counts[key]
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """
+    Yield the positions of the bits set in mask, from lowest to highest.
+
+    >>> list(iter_bits(0b10110))
+    [1, 2, 4]
+
+    Preconditions:
+    - mask >= 0
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def check_conflict(occupied: int, occupancy: int) -> bool:
     """
-    A helper function for the Schedule class. Return whether there would be any overlapping time intervals if a
-    dictionary of tuples (which represent time intervals for a course) were to be merged with another dictionary of
-    tuples (which represnts time intervals for the course's ancestors). Return True if there are overlaps.
-    Return False if there are no overlaps.
+    A helper function for the Schedule class. Return whether a section's occupancy bitmask overlaps the combined
+    occupancy bitmask of the course's ancestors. Since the bitmasks are split by semester, a fall section never
+    conflicts with a winter section. Return True if there are overlaps. Return False if there are no overlaps.
 
     Preconditions:
-    - day_time_1 != {}
-    - day_time_2 != {}
-    """
-    for day in day_time_1:
-        for time1 in day_time_1[day]:
-            for time2 in day_time_2[day]:
-                if max(time1[0], time2[0]) < min(time1[1], time2[1]):
-                    # Overlap spotted
-                    return True
-    # Overlap not spotted
-    return False
+    - occupied >= 0
+    - occupancy >= 0
+    """
+    return occupied & occupancy != 0
+
+
+def compile_section(course: str, room_times: dict[str, tuple[tuple[tuple[str, ...], tuple[float, float]], ...]]) \
+        -> CompiledSection:
+    """
+    Return the CompiledSection of a section of the given course, whose lectures are given by room_times, which may
+    be the same object as that of another section with the same lecture times and buildings. Year-long courses use
+    their first room in the fall and their second room in the winter, while the other courses only use their first
+    room.
+
+    Preconditions:
+    - course[-1] in SEMESTERS
+    - all(day in DAYS for day in room_times)
+    """
+    lectures = [lecture for day in room_times for lecture in room_times[day]]
+    num_sems = len(SEMESTERS[course[-1]])
+    days = []
+    for sem in SEMESTERS[course[-1]]:
+        room = sem if course[-1] == 'Y' else 0
+        for day in room_times:
+            if room_times[day]:
+                # sorted is stable, so lectures that start at the same time stay in the order of room_times
+                days.append(share((sem * len(DAYS) + DAYS.index(day),
+                                   share(tuple(sorted((share((lecture[1][0], lecture[1][1],
+                                                              _building_code(lecture[0][room])))
+                                                       for lecture in room_times[day]), key=itemgetter(0)))))))
+    return share(CompiledSection(compile_occupancy(course, room_times),
+                                 num_sems * sum(1 for lecture in lectures if lecture[1][0] < 10.0),
+                                 num_sems * sum(1 for lecture in lectures if lecture[1][1] > 17.0),
+                                 num_sems * len(lectures), tuple(days)))
+
+
+def share(value: Hashable) -> Hashable:
+    """
+    Return an equal immutable value that is already used by another section if there is one (and otherwise value
+    itself), so that the lectures, rooms, times and compiled records that many sections have in common are only stored
+    once.
+    """
+    return _shared.setdefault(value, value)
+
+
+def _building_code(room: str) -> str:
+    """Return the building code of a room, interned so that every section that uses the building shares it."""
+    return sys.intern(room.split()[0])
+
+
+def compile_occupancy(course: str, room_times: dict[str, tuple[tuple[tuple[str, ...], tuple[float, float]], ...]]) \
+        -> int:
+    """
+    Return the occupancy bitmask of a section of the given course, whose lectures are given by room_times. Each
+    semester the course runs in gets one block of SLOTS_PER_DAY bits for every day of the week, and each lecture
+    sets the bits of the slots between its start (inclusive) and end (exclusive) times.
+
+    Preconditions:
+    - course[-1] in SEMESTERS
+    - all(day in DAYS for day in room_times)
+    """
+    mask = 0
+    for sem in SEMESTERS[course[-1]]:
+        for day in room_times:
+            base = (sem * len(DAYS) + DAYS.index(day)) * SLOTS_PER_DAY
+            for lecture in room_times[day]:
+                first, last = round(lecture[1][0] * SLOTS_PER_HOUR), round(lecture[1][1] * SLOTS_PER_HOUR)
+                mask |= ((1 << (last - first)) - 1) << (base + first)
+    return mask
 
 
 if __name__ == '__main__':
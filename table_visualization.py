@@ -4,10 +4,10 @@
 
 This python module contains the functions necessary to display
 the timetables to the user. This python module will take a list of
-SectInfo (which represents a timetable) and display that list of
-SectInfo on an Excel spreadsheet as a formatted timetable. Then,
-the Excel spreadsheet will be converted to an HTML page, which will then
-be displayed to the user.
+SectInfo (which represents a timetable) and render that list of
+SectInfo as an HTML page with a formatted timetable, which will then
+be displayed to the user. The same timetable can also be exported to
+an Excel spreadsheet.
 
 Copyright and Usage Information
 ===============================
@@ -18,33 +18,89 @@ expressly prohibited.
 
 This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
 """
+import html
 import math
-import openpyxl
-from openpyxl.styles import Alignment, PatternFill, Font
-from xlsx2html import xlsx2html
 
 from schedule_tree import SectInfo
 
-FONT_COURSES_DAYS = Font(name='Arial', size=12, color='000000')
 LST_COLORS = ['FFF1E6', 'FDE2E4', 'FAD2E1', 'E2ECE9', 'BEE1E6', 'F0EFEB', 'CDDAFD', 'DDDBCB', 'CBEEF3',
               'FFC100', 'FFEAAE', '8FBC94', 'C5E99B', 'D8DAD3', '5C9EAD']
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
+TIMES = ['9:00', '9:30', '10:00', '10:30', '11:00', '11:30', '12:00', '12:30', '13:00', '13:30', '14:00', '14:30',
+         '15:00', '15:30', '16:00', '16:30', '17:00', '17:30', '18:00', '18:30', '19:00', '19:30', '20:00', '20:30',
+         '21:00']
+CELL_STYLE = 'color: #000000; font-family: Arial; font-size: 12.0px; height: 19pt'
 
 
-def make_timetable(section: list[SectInfo]) -> None:
+def render_timetable(section: list[SectInfo]) -> str:
     """
-    This is the most important function of this file. This function is responsible for generating the timetable and
-    saving it into an Excel file in the format '.xlsx'. It then converts this file to a '.htm' file.
+    This is the most important function of this file. This function is responsible for generating the timetable as
+    an HTML page, with the first semester on the left and the second semester on the right, and returning it as a
+    string. It lays out the timetable the same way as the spreadsheet from make_timetable, without writing any files.
 
     Preconditions:
     - all(isinstance(item, SectInfo) for item in section)
     """
+    timetable_data = (times_maker(fall_winter_splitter(section, 'fall')),
+                      times_maker(fall_winter_splitter(section, 'winter')))
+    dict_colours = colour_assign(section)
+
+    # Each row of the grid maps a column (0 for the first semester's times, 1 to 5 for its days, 9 for the second
+    # semester's times, 10 to 14 for its days) to the cell's text and background colour
+    grid = [{0: ('1st Semester', None), 9: ('2nd Semester', None)}] + [{} for _ in TIMES]
+    for j, day in enumerate(DAYS):
+        grid[0][j + 1], grid[0][j + 10] = (day, None), (day, None)
+    for i in range(0, len(TIMES), 2):
+        grid[i + 1][0], grid[i + 1][9] = (TIMES[i], None), (TIMES[i], None)
+
+    for sem, first_column in ((0, 1), (1, 10)):
+        for day, classes in timetable_data[sem].items():
+            set_so_far = set()
+            for time, classname in classes.items():
+                if time not in TIMES:
+                    continue
+                text = classname if classname not in set_so_far else ''
+                set_so_far.add(classname)
+                grid[TIMES.index(time) + 1][DAYS.index(day) + first_column] = (text, dict_colours[classname[0:10]])
+
+    rows = []
+    for i, row in enumerate(grid):
+        cells = []
+        for column in range(15):
+            text, colour = row.get(column, ('', None))
+            style = CELL_STYLE
+            if colour is not None:
+                style += f'; background-color: #{colour}'
+            if text:
+                style += '; text-align: center; vertical-align: middle'
+            if i == 0 and column in (0, 9):
+                style += '; font-weight: bold'
+            cells.append(f'<td style="{style}">{html.escape(text) if text else "&nbsp;"}</td>')
+        rows.append('<tr>' + ''.join(cells) + '</tr>')
+
+    widths = [163.2] + [134.4] * 5 + [64.0] * 3 + [163.2] + [134.4] * 5
+    colgroup = ''.join(f'<col style="width: {width}px">' for width in widths)
+    return ('<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8"><title>Timetable</title></head><body>'
+            '<table style="border-collapse: collapse" border="0" cellspacing="0" cellpadding="0">'
+            f'<colgroup>{colgroup}</colgroup>{"".join(rows)}</table></body></html>')
+
+
+def make_timetable(section: list[SectInfo], filename: str = 'timetable.xlsx') -> None:
+    """
+    This function exports the timetable by generating it as an Excel spreadsheet and saving it to filename in the
+    format '.xlsx'.
+
+    Preconditions:
+    - all(isinstance(item, SectInfo) for item in section)
+    """
+    # openpyxl is only imported here, so that displaying timetables with render_timetable does not need it
+    import openpyxl
+    from openpyxl.styles import Alignment, PatternFill, Font
+
     wb = openpyxl.Workbook()
     ws = wb.active
 
-    days, times = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri'], ['9:00', '9:30', '10:00', '10:30', '11:00', '11:30', '12:00',
-                                                        '12:30', '13:00', '13:30', '14:00', '14:30',
-                                                        '15:00', '15:30', '16:00', '16:30', '17:00', '17:30', '18:00',
-                                                        '18:30', '19:00', '19:30', '20:00', '20:30', '21:00']
+    days, times = DAYS, TIMES
     ws.append([''] + days)
     for i in range(0, len(times), 2):
         ws.cell(row=i + 2, column=1, value=times[i]).alignment = Alignment(horizontal='center', vertical='center',
@@ -95,12 +151,11 @@ def make_timetable(section: list[SectInfo]) -> None:
     for letter in ('A', 'B', 'C', 'D', 'E', 'F', 'J', 'K', 'L', 'M', 'N', 'O'):
         ws.column_dimensions[letter].width = 14
         for num in range(1, 27):
-            ws[letter + str(num)].font = FONT_COURSES_DAYS
+            ws[letter + str(num)].font = Font(name='Arial', size=12, color='000000')
 
     ws.column_dimensions['A'].width, ws.column_dimensions['J'].width = 17, 17
     ws['A1'].font, ws['J1'].font = [Font(name='Arial', size=12, color='000000', bold=True)] * 2
-    wb.save('timetable.xlsx')
-    xlsx2html('timetable.xlsx', 'timetable.htm')
+    wb.save(filename)
 
 
 def times_maker(section_information: list[SectInfo]) -> dict[str, dict[str, str]]:
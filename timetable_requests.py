@@ -0,0 +1,87 @@
+"""CSC111 FINAL PROJECT: UT-TABLER
+
+===============================
+
+This python module contains the functions shared by the ways of generating timetables without the GUI (batch_cli and
+timetable_service): loading the whole catalog once, validating a request for timetables given as JSON, answering it
+with JSON-friendly timetables, and summarizing the time taken by many requests.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the users of the UT-TABLER application.
+All forms of distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
+"""
+import math
+
+from distances import load_building_distances
+from parse_functions import load_course_index, parse_course_csv
+from tree_computations import get_ttables_ranked, score_timetable
+
+
+def load_catalog() -> None:
+    """
+    Parse every course in the catalog and compute the building distance matrix, so that every request after this
+    reuses them. Worker processes that are forked after this is called inherit both without parsing anything.
+    """
+    parse_course_csv(set(load_course_index()))
+    load_building_distances()
+
+
+def validate_request(request: object) -> tuple[list[str], list[int]]:
+    """
+    Return the courses and ranks of a request (with ranks defaulting to [0, 1, 2]), or raise ValueError if the request
+    is not a JSON object with a non-empty list of known course codes and an ordering of 0, 1 and 2 as ranks.
+    """
+    if not isinstance(request, dict):
+        raise ValueError('invalid request: expected a JSON object')
+    courses = request.get('courses')
+    ranks = request.get('ranks', [0, 1, 2])
+    if not isinstance(courses, list) or not courses or not all(isinstance(course, str) for course in courses):
+        raise ValueError('invalid request: courses must be a non-empty list of course codes')
+    if not isinstance(ranks, list) or not all(type(rank) is int for rank in ranks) or sorted(ranks) != [0, 1, 2]:
+        raise ValueError('invalid request: ranks must be an ordering of 0, 1 and 2')
+    unknown = sorted(set(courses) - set(load_course_index()))
+    if unknown:
+        raise ValueError('unknown courses: ' + ', '.join(unknown))
+    return courses, ranks
+
+
+def timetables_json(courses: list[str], ranks: list[int]) -> list[dict]:
+    """
+    Return the ranked timetables of the given courses as JSON-friendly dictionaries, each holding the scores of the
+    timetable and the code and instructors of each of its sections.
+
+    Preconditions:
+    - courses != [] and every course is in the catalog
+    - sorted(ranks) == [0, 1, 2]
+    """
+    timetables = []
+    for ttable in get_ttables_ranked(set(courses), ranks):
+        distance, morning, evening = score_timetable(ttable)
+        timetables.append({'distance': distance, 'morning': morning, 'evening': evening,
+                           'sections': [{'course': section.course, 'section': section.sect,
+                                         'instructors': section.instructors} for section in ttable]})
+    return timetables
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """
+    Return the value at the given fraction of the sorted values (using the nearest rank), or 0.0 if there are none.
+
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 0.5)
+    2.0
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 0.95)
+    4.0
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
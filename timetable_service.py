@@ -0,0 +1,221 @@
+"""CSC111 FINAL PROJECT: UT-TABLER
+
+===============================
+
+This python module is a local HTTP service that lets many users generate timetables from one process, using only
+the standard library (asyncio). The catalog and building distances stay in memory, and the searches run on a pool
+of worker processes so that the event loop keeps serving other requests. Identical requests that arrive while the
+same search is running share its result, and recent results are kept in a bounded LRU cache.
+
+    python timetable_service.py --port 8111 --workers 4
+
+Endpoints:
+- GET /timetables?courses=CSC108H1-F,MAT135H1-F&ranks=1,2,0 (ranks is optional, as in batch_cli)
+- POST /timetables with a JSON body like {"courses": ["CSC108H1-F", "MAT135H1-F"], "ranks": [1, 2, 0]}
+- GET /metrics for request counts, cache and coalescing statistics, queue depth and latencies
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the users of the UT-TABLER application.
+All forms of distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from timetable_requests import load_catalog, percentile, timetables_json, validate_request
+
+CACHE_SIZE = 256
+LATENCY_WINDOW = 1000  # The number of most recent requests that the latency metrics are computed over
+MAX_BODY_SIZE = 64 * 1024
+
+
+class TimetableService:
+    """Answers timetable queries with a pool of worker processes, coalescing identical queries that are in flight
+    and caching the most recent results.
+
+    A query is keyed by the set of its courses and its ranks, so the order the courses are given in doesn't matter.
+
+    Instance Attributes:
+    - executor: The pool of worker processes that run the searches
+    - cache_size: The largest number of results kept in cache
+    - cache: The most recently used results, from least to most recently used
+    - in_flight: The searches that are currently running or waiting for a worker, by query
+    - counts: The number of requests, cache hits, coalesced queries, searches and errors so far
+    - max_queue_depth: The most searches that have been in flight at once
+    - latencies: The time taken to answer each of the last LATENCY_WINDOW queries, in seconds
+
+    Representation Invariants:
+    - len(self.cache) <= self.cache_size
+    - not any(key in self.cache for key in self.in_flight)
+    """
+    executor: ProcessPoolExecutor
+    cache_size: int
+    cache: OrderedDict[tuple[frozenset[str], tuple[int, ...]], list[dict]]
+    in_flight: dict[tuple[frozenset[str], tuple[int, ...]], asyncio.Future]
+    counts: dict[str, int]
+    max_queue_depth: int
+    latencies: deque[float]
+
+    def __init__(self, workers: int, cache_size: int = CACHE_SIZE) -> None:
+        load_catalog()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=load_catalog)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.counts = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'searches': 0, 'errors': 0}
+        self.max_queue_depth = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def get_timetables(self, courses: list[str], ranks: list[int]) -> list[dict]:
+        """Return the ranked timetables of the given courses (see timetable_requests.timetables_json), from the cache,
+        from an identical search that is already in flight, or from a new search on the worker pool."""
+        start = time.perf_counter()
+        key = (frozenset(courses), tuple(ranks))
+        if key in self.cache:
+            self.counts['cache_hits'] += 1
+            self.cache.move_to_end(key)
+            result = self.cache[key]
+        elif key in self.in_flight:
+            self.counts['coalesced'] += 1
+            result = await asyncio.shield(self.in_flight[key])
+        else:
+            self.counts['searches'] += 1
+            search = asyncio.get_running_loop().run_in_executor(self.executor, timetables_json, sorted(key[0]), ranks)
+            self.in_flight[key] = search
+            self.max_queue_depth = max(self.max_queue_depth, len(self.in_flight))
+            try:
+                result = await asyncio.shield(search)
+            finally:
+                del self.in_flight[key]
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def metrics(self) -> dict:
+        """Return the request counts, the current and largest queue depths (the number of searches in flight), the
+        cache size, and the mean, median, 95th percentile and maximum latency of recent queries in seconds."""
+        latencies = sorted(self.latencies)
+        return {**self.counts, 'queue_depth': len(self.in_flight), 'max_queue_depth': self.max_queue_depth,
+                'cached_results': len(self.cache),
+                'latency_seconds': {'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                                    'median': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95),
+                                    'max': latencies[-1] if latencies else 0.0}}
+
+    async def respond(self, method: str, target: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        """Return the status and JSON body of the response to an HTTP request."""
+        url = urlsplit(target)
+        if url.path == '/metrics' and method == 'GET':
+            return HTTPStatus.OK, self.metrics()
+        elif url.path != '/timetables':
+            return HTTPStatus.NOT_FOUND, {'error': f'no such endpoint: {url.path}'}
+        elif method not in ('GET', 'POST'):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f'{method} is not supported'}
+
+        self.counts['requests'] += 1
+        try:
+            if method == 'POST':
+                request = json.loads(body)
+            else:
+                request = _query_request(parse_qs(url.query))
+            courses, ranks = validate_request(request)
+        except json.JSONDecodeError as error:
+            self.counts['errors'] += 1
+            return HTTPStatus.BAD_REQUEST, {'error': f'invalid request: {error}'}
+        except ValueError as error:
+            self.counts['errors'] += 1
+            return HTTPStatus.BAD_REQUEST, {'error': str(error)}
+
+        return HTTPStatus.OK, {'courses': sorted(set(courses)), 'ranks': ranks,
+                               'timetables': await self.get_timetables(courses, ranks)}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Read one HTTP request from a connection, write the response, and close the connection."""
+        request = None
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if len(request_line) == 3 and 0 <= length <= MAX_BODY_SIZE:
+                request = request_line[0], request_line[1], await reader.readexactly(length)
+        except (ValueError, asyncio.IncompleteReadError):
+            pass
+
+        if request is None:
+            status, response = HTTPStatus.BAD_REQUEST, {'error': 'malformed request'}
+        else:
+            try:
+                status, response = await self.respond(*request)
+            except Exception as error:  # The search failed, so report it instead of dropping the connection
+                self.counts['errors'] += 1
+                status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': repr(error)}
+
+        payload = json.dumps(response).encode()
+        writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode() + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        self.executor.shutdown(cancel_futures=True)
+
+
+def _query_request(query: dict[str, list[str]]) -> dict:
+    """Return the request given by the query string of a GET request, in the same form as a POST body."""
+    request = {'courses': [course for value in query.get('courses', []) for course in value.split(',') if course]}
+    if 'ranks' in query:
+        request['ranks'] = [int(rank) for rank in query['ranks'][-1].split(',')]
+    return request
+
+
+async def serve(host: str, port: int, workers: int, cache_size: int) -> None:
+    """Run the service on the given host and port until it is cancelled."""
+    service = TimetableService(workers, cache_size)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f'Serving timetables on http://{host}:{port}', file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv: list[str]) -> None:
+    """Run the service with the given command-line arguments."""
+    parser = argparse.ArgumentParser(description='Serve ranked timetables over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on (default: only this machine)')
+    parser.add_argument('--port', type=int, default=8111, help='the port to listen on (default: 8111)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='the number of worker processes (default: the number of CPUs)')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                        help=f'the number of results to keep in cache (default: {CACHE_SIZE})')
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.cache_size < 0:
+        parser.error('--workers must be at least 1 and --cache-size cannot be negative')
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
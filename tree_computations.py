@@ -16,28 +16,1188 @@ expressly prohibited.
 This file is Copyright (c) 2023 Anbuselvan Ragunathan, Sanchaai Mathiyarasan, Yathusan Koneswararajah
 """
 
-from math import cos
-from parse_functions import parse_coordinates, parse_course_csv
-from schedule_tree import Schedule, SectInfo
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, Optional
+from batch_scoring import best_candidates
+from distances import building_distance, distance_lower_bound
+from parse_functions import parse_course_csv
+from schedule_tree import DAYS, CompatibilityMatrix, SectInfo, TimetableDAG, check_conflict, \
+    group_sections, iter_bits, iter_ttables
 
+MAX_TTABLES = 15
+SUBPROBLEMS_PER_WORKER = 4
+PROGRESS_INTERVAL = 2000  # The number of partial timetables explored between calls to a progress callback
+PROFILE_LINES = 25  # The number of functions listed in the profile report of a SearchStats
+SESSION_SIZE = 32  # The number of results kept by a SearchSession
+EXTENSIONS_PER_TIMETABLE = 16  # The number of seeds a SearchSession makes from each timetable of fewer courses
+MAX_MISSING_COURSES = 2  # The most courses a SearchSession adds to the timetables of fewer courses to make seeds
+ALL_RANKS = [list(ranks) for ranks in itertools.permutations(range(3))]  # Every ranking of the three scores
 
-def get_ttables_ranked(wanted: set[str], ranks: list[int]) -> list[list[SectInfo]]:
+
+class SearchCancelled(Exception):
+    """Exception raised by a progress callback of get_ttables_ranked to stop the search early."""
+
+
+@dataclass
+class SearchStats:
+    """Metrics recorded by one call of get_ttables_ranked, to find out why a query is slow.
+
+    The counters of the search are only recorded by the branch-and-bound search (with prune set to True), and when it
+    runs on several worker processes they are added up over all of its subproblems. The profile and the peak memory
+    only cover the process that called get_ttables_ranked.
+
+    Instance Attributes:
+    - profile: Whether to run the whole call under cProfile and tracemalloc
+    - courses: The number of courses searched
+    - sections: The number of sections of these courses
+    - classes: The number of classes of interchangeable sections that the search used (see group_sections)
+    - pair_checks: The number of pairs of sections of different courses checked for a conflict (see
+                   CompatibilityMatrix)
+    - pair_conflicts: The number of those pairs that conflict
+    - nodes: The number of partial timetables explored, including the complete ones
+    - scored: The number of complete timetables scored
+    - tried: The number of sections tried as the next section of a partial timetable
+    - rejected: The number of those sections that conflicted, or left some remaining course with no section that fits
+    - pruned: The number of partial timetables skipped because they could not beat the timetables already kept
+    - parse_seconds: The time spent parsing the courses
+    - group_seconds: The time spent grouping the sections into classes
+    - search_seconds: The time spent searching, including score_seconds
+    - score_seconds: The time spent scoring complete timetables during the search
+    - sort_seconds: The time spent expanding the best timetables into their concrete sections and sorting them
+    - total_seconds: The time taken by the whole call
+    - peak_memory: The largest amount of memory allocated at once during the call (in bytes), if profile is True
+    - profile_report: The functions that took the most cumulative time during the call, if profile is True
+
+    Representation Invariants:
+    - self.scored <= self.nodes
+    - self.rejected <= self.tried
+    """
+    profile: bool = False
+    courses: int = 0
+    sections: int = 0
+    classes: int = 0
+    pair_checks: int = 0
+    pair_conflicts: int = 0
+    nodes: int = 0
+    scored: int = 0
+    tried: int = 0
+    rejected: int = 0
+    pruned: int = 0
+    parse_seconds: float = 0.0
+    group_seconds: float = 0.0
+    search_seconds: float = 0.0
+    score_seconds: float = 0.0
+    sort_seconds: float = 0.0
+    total_seconds: float = 0.0
+    peak_memory: int = 0
+    profile_report: str = field(default='', repr=False)
+
+    def add_counters(self, counters: dict[str, float]) -> None:
+        """Add the counters of a search (see _RankedSearch.counters) to these stats."""
+        for name, value in counters.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def summary(self) -> str:
+        """Return a one-line summary of these stats.
+
+        >>> SearchStats(courses=2, sections=30, nodes=120, scored=80, pruned=5, total_seconds=0.25).summary()
+        '2 courses (30 sections) in 250 ms: 120 partial timetables, 80 scored, 5 pruned'
+        """
+        line = (f'{self.courses} courses ({self.sections} sections) in {self.total_seconds * 1000:.0f} ms: '
+                f'{self.nodes:,} partial timetables, {self.scored:,} scored, {self.pruned:,} pruned')
+        if self.peak_memory:
+            line += f', peak memory {self.peak_memory / 2 ** 20:.1f} MiB'
+        return line
+
+
+def get_ttables_ranked(wanted: set[str], ranks: list[int], prune: bool = True, propagate: bool = True,
+                       decompose: bool = True, workers: int = 1,
+                       progress: Optional[Callable[[int, int, list[list[SectInfo]]], None]] = None,
+                       stats: Optional[SearchStats] = None,
+                       on_stats: Optional[Callable[[SearchStats], None]] = None,
+                       seeds: Optional[list[list[SectInfo]]] = None) -> list[list[SectInfo]]:
     """
     This function takes in a list of desired courses and a list used to represent the user's prioritization of
     building proximity, minimizing early classes, and minimizing late classes. It then gets the corresponding
-    course_dict associated with the wanted courses (which contains the info for each course), constructs a tree
-    using course_dict, then gets possible paths and ranks them baased on user preference. It then returns the top
-    15 timetables.
+    course_dict associated with the wanted courses (which contains the info for each course), lazily enumerates every
+    possible timetable and ranks them based on user preference. Only the best MAX_TTABLES timetables seen so far are
+    kept (in a bounded heap), and they are returned in ranked order.
+
+    If prune is True, a branch-and-bound search (see _RankedSearch) skips every partial timetable that cannot beat the
+    timetables already kept, and if propagate is also True it uses forward checking to find dead ends early. The
+    result is the same as with prune set to False, which scores every timetable in blocks with NumPy (see
+    batch_scoring). If prune is True and workers is more
+    than 1, the search is split into independent subproblems that are solved by a pool of that many processes (see
+    _search_parallel). Otherwise, if decompose is also True and there are both fall and winter courses, the two terms
+    are searched separately and their timetables are merged (see _SemesterSearch).
+
+    If progress is given and the search runs in this process with pruning, it is called every PROGRESS_INTERVAL
+    partial timetables with the number of partial timetables explored, the number of complete timetables scored, and
+    the best timetables found so far (in ranked order). It can raise SearchCancelled to stop the search, which is then
+    raised by this function.
+
+    Sections of a course that meet at the same times in the same buildings are interchangeable, so the search only
+    uses the first section of each such class (see group_sections), and the best timetables are expanded back into
+    their concrete sections at the end.
+
+    If seeds is given, it holds timetables of the wanted courses that are already known (for example from earlier
+    searches, see SearchSession). With pruning, the best MAX_TTABLES of them are kept before the search starts, so it
+    can prune from the start, and the result is the same as without them. Seeds that aren't conflict-free timetables
+    of exactly the wanted courses (with sections from parse_course_csv) are ignored.
+
+    If stats is given, the metrics of this call are recorded in it (see SearchStats), including a profile and the
+    peak memory if stats.profile is True. If on_stats is given, it is called with the stats (or with new ones, if
+    stats isn't given) once the timetables have been found.
+    """
+    if stats is None and on_stats is None:
+        return _find_ttables(wanted, ranks, prune, propagate, decompose, workers, progress, None, seeds)
+    stats = stats if stats is not None else SearchStats()
+    if not stats.profile:
+        ttables = _find_ttables(wanted, ranks, prune, propagate, decompose, workers, progress, stats, seeds)
+    else:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        try:
+            ttables = profiler.runcall(_find_ttables, wanted, ranks, prune, propagate, decompose, workers, progress,
+                                       stats, seeds)
+        finally:
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            stats.profile_report = report.getvalue()
+    if on_stats is not None:
+        on_stats(stats)
+    return ttables
+
+
+def _find_ttables(wanted: set[str], ranks: list[int], prune: bool, propagate: bool, decompose: bool, workers: int,
+                  progress: Optional[Callable[[int, int, list[list[SectInfo]]], None]],
+                  stats: Optional[SearchStats], seeds: Optional[list[list[SectInfo]]]) -> list[list[SectInfo]]:
+    """Return the result of get_ttables_ranked with the given arguments, recording its metrics in stats if it isn't
+    None."""
+    start = time.perf_counter()
+    course_dict = parse_course_csv(wanted)
+    # Sorted so that ties are broken the same way in every process, whatever the order of the wanted set
+    course_names = sorted(course_dict)
+    parsed = time.perf_counter()
+    classes = {name: group_sections(course_dict[name]) for name in course_names}
+    class_dict = {name: [group[0] for group in classes[name]] for name in course_names}
+    seed_positions = _seed_positions(seeds or [], course_names, classes) if prune else []
+    grouped = time.perf_counter()
+    if prune and workers > 1:
+        best, counters = _search_parallel(class_dict, course_names, ranks, propagate, workers, stats is not None,
+                                          seed_positions)
+    elif prune:
+        if decompose and all(any(name.endswith(term) for name in course_names) for term in 'FS'):
+            search = _SemesterSearch(class_dict, course_names, ranks, timed=stats is not None)
+        else:
+            search = _RankedSearch(class_dict, course_names, ranks, propagate, timed=stats is not None)
+        search.seed(seed_positions)
+        if progress is not None:
+            search.report = lambda nodes, scored, ttables: progress(nodes, scored, _expand_ttables(
+                ttables, course_dict, classes, ranks))
+        best, counters = search.run(), search.counters()
+    else:
+        best = [[class_dict[name][position] for name, position in zip(course_names, positions)]
+                for positions in best_candidates(class_dict, course_names, ranks, MAX_TTABLES)]
+        counters = {}
+    searched = time.perf_counter()
+    ttables = _expand_ttables(best, course_dict, classes, ranks)
+
+    if stats is not None:
+        end = time.perf_counter()
+        stats.courses = len(course_names)
+        stats.sections = sum(len(course_dict[name]) for name in course_names)
+        stats.classes = sum(len(class_dict[name]) for name in course_names)
+        stats.add_counters(counters)
+        stats.parse_seconds += parsed - start
+        stats.group_seconds += grouped - parsed
+        stats.search_seconds += searched - grouped
+        stats.sort_seconds += end - searched
+        stats.total_seconds += end - start
+    return ttables
+
+
+def _seed_positions(seeds: list[list[SectInfo]], course_names: list[str],
+                    classes: dict[str, list[list[SectInfo]]]) -> list[tuple[int, ...]]:
+    """
+    Return the distinct timetables in seeds as the positions of the classes of their sections (see group_sections), in
+    the order of course_names, leaving out those that aren't conflict-free timetables of exactly these courses made of
+    sections in classes.
+    """
+    position = {id(sect): (name, i) for name in course_names for i, group in enumerate(classes[name]) for sect in group}
+    seed_positions = set()
+    for ttable in seeds:
+        found, occupied = {}, 0
+        for sect in ttable:
+            if id(sect) not in position or check_conflict(occupied, sect.occupancy):
+                break
+            name, i = position[id(sect)]
+            found[name] = i
+            occupied |= sect.occupancy
+        else:
+            if len(found) == len(ttable) == len(course_names):
+                seed_positions.add(tuple(found[name] for name in course_names))
+    return sorted(seed_positions)
+
+
+def find_conflicting_courses(wanted: set[str]) -> list[tuple[str, str]]:
+    """
+    Return every pair of courses in wanted that can never be taken together, in sorted order (see
+    CompatibilityMatrix.conflicting_courses). If get_ttables_ranked finds no timetables but this is empty, the courses
+    conflict with each other only in larger groups.
+    """
+    course_dict = parse_course_csv(wanted)
+    return CompatibilityMatrix(course_dict, sorted(course_dict)).conflicting_courses()
+
+
+def count_ttables(wanted: set[str]) -> int:
+    """
+    Return the number of conflict-free timetables of the wanted courses, without enumerating them (see TimetableDAG),
+    so that the size of a search is known before it is run.
     """
     course_dict = parse_course_csv(wanted)
-    tree = Schedule(None)
-    course_names = list(course_dict.keys())
-    tree.add_sections(course_dict, course_names,
-                      {'Mon': [], 'Tue': [], 'Wed': [], 'Thu': [], 'Fri': []})
+    return TimetableDAG(course_dict, sorted(course_dict)).count()
 
-    possible_ttables = [p for p in tree.accumulate_ttables() if len(p) == len(wanted)]
-    possible_ttables.sort(key=lambda ttable: _compute_scores(ttable, ranks))
-    return possible_ttables[:15]
+
+def sample_ttables(wanted: set[str], k: int, seed: Optional[int] = None) -> list[list[SectInfo]]:
+    """
+    Return k conflict-free timetables of the wanted courses, each chosen uniformly at random from all of them
+    (independently, so the same timetable may be chosen more than once), or [] if there are none. This gives a fair
+    picture of the timetables of a course set that has far too many to search through. The same seed always gives the
+    same timetables.
+
+    Preconditions:
+    - k >= 0
+    """
+    course_dict = parse_course_csv(wanted)
+    dag = TimetableDAG(course_dict, sorted(course_dict))
+    if not dag.count():
+        return []
+    rng = random.Random(seed)
+    return [dag.sample(rng) for _ in range(k)]
+
+
+def get_ttables_pareto(wanted: set[str], ranks: list[int], limit: int = MAX_TTABLES, propagate: bool = True,
+                       decompose: bool = True) -> list[list[SectInfo]]:
+    """
+    Return the Pareto frontier (skyline) of the timetables of the wanted courses: a timetable for each combination of
+    average distance, morning classes and evening classes that no other timetable matches or beats in all three scores
+    while beating it in at least one. Unlike get_ttables_ranked, whose best MAX_TTABLES timetables by the user's
+    ranking are often small variations on the same trade-off, this gives one timetable for every trade-off between the
+    scores. Of the timetables with the same scores, the one with the lowest section positions is used, as in
+    get_ttables_ranked.
+
+    The frontier is found by a branch-and-bound search that discards every partial timetable whose optimistic scores
+    are already dominated (see _ParetoSearch), with forward checking if propagate is True, and searching the fall and
+    winter terms separately if decompose is True, as in get_ttables_ranked. If it has more than limit timetables,
+    limit of them are chosen to spread over it (see _spread_frontier). The timetables are returned in the order given
+    by ranks. Like get_ttables_ranked, this returns [] if the courses have no timetables.
+
+    >>> get_ttables_pareto({'CSC108H1-F', 'FOO1234H1-F'}, [0, 1, 2])
+    []
+    >>> len(get_ttables_pareto({'CSC108H1-F'}, [0, 1, 2])) >= 1
+    True
+
+    Preconditions:
+    - sorted(ranks) == [0, 1, 2]
+    - limit >= 1
+    """
+    course_dict = parse_course_csv(wanted)
+    course_names = sorted(course_dict)
+    # The first section of a class has the lowest position in it, so the timetables need no expansion
+    class_dict = {name: [group[0] for group in group_sections(course_dict[name])] for name in course_names}
+    search = _ParetoSearch(class_dict, course_names, ranks, propagate, decompose)
+    search.run()
+    return [point[2] for point in _spread_frontier(search.points(), ranks, limit)]
+
+
+def _spread_frontier(points: list[tuple[tuple[float, int, int], tuple[int, ...], object]], ranks: list[int],
+                     limit: int) -> list[tuple[tuple[float, int, int], tuple[int, ...], object]]:
+    """
+    Return at most limit of the given frontier points, as (scores, positions, timetable) tuples, in the order given by
+    ranks and then by positions. If there are too many, the best point under each ranking in ALL_RANKS (starting with
+    ranks) is chosen first, since these are the extremes of the frontier, and then the point farthest from every point
+    chosen so far, with each score scaled to the range it takes on the frontier.
+
+    >>> points = [((float(d), m, 0), (d,), f'd={d} m={m}') for d, m in [(0, 4), (1, 3), (2, 2), (3, 1), (4, 0)]]
+    >>> [point[2] for point in _spread_frontier(points, [0, 1, 2], 3)]
+    ['d=0 m=4', 'd=2 m=2', 'd=4 m=0']
+
+    Preconditions:
+    - limit >= 1
+    """
+    points = sorted(points, key=lambda point: ([point[0][rank] for rank in ranks], point[1]))
+    if len(points) <= limit:
+        return points
+
+    chosen = []
+    for order in [ranks] + ALL_RANKS:
+        i = min(range(len(points)), key=lambda j: ([points[j][0][rank] for rank in order], points[j][1]))
+        if i not in chosen:
+            chosen.append(i)
+    chosen = chosen[:limit]
+
+    lows = [min(point[0][s] for point in points) for s in range(3)]
+    spans = [max(point[0][s] for point in points) - lows[s] for s in range(3)]
+    scaled = [[(point[0][s] - lows[s]) / spans[s] if spans[s] else 0.0 for s in range(3)] for point in points]
+    gaps = [min(sum((a - b) ** 2 for a, b in zip(scaled[i], scaled[j])) for j in chosen) for i in range(len(points))]
+    while len(chosen) < limit:
+        i = max(range(len(points)), key=lambda j: gaps[j])
+        chosen.append(i)
+        gaps = [min(gap, sum((a - b) ** 2 for a, b in zip(scaled[j], scaled[i]))) for j, gap in enumerate(gaps)]
+    return [points[i] for i in sorted(chosen)]
+
+
+class RankedCandidates:
+    """Timetables of a set of courses kept with their scores, so that they can be ranked for any ranking of the scores
+    by sorting them instead of searching again.
+
+    ranked(ranks) gives the same timetables as get_ttables_ranked for the same courses and ranks as long as the
+    timetables include the result of get_ttables_ranked for those ranks, since the timetables are sorted the same way.
+    So the union of the results under every ranking in ALL_RANKS (at most 6 * MAX_TTABLES timetables) can be ranked
+    exactly for any of them. Timetables with a section that is no longer in course_info.csv are left out.
+
+    Instance Attributes:
+    - candidates: The distinct timetables, each as ((distance, morning, evening) scores, positions of its sections in
+                  course_dict, timetable)
+    """
+    candidates: list[tuple[tuple[float, int, int], list[int], list[SectInfo]]]
+
+    def __init__(self, ttables: list[list[SectInfo]]) -> None:
+        course_dict = parse_course_csv({sect.course for ttable in ttables for sect in ttable})
+        # Sections are found by their codes rather than by identity, since the courses may have been parsed again
+        # (for example by another thread) since the timetables were found
+        position = {(sect.course, sect.sect): i for name in course_dict for i, sect in enumerate(course_dict[name])}
+        unique = {}
+        for ttable in ttables:
+            keys = [(sect.course, sect.sect) for sect in ttable]
+            if not all(key in position for key in keys):
+                continue  # course_info.csv changed and no longer has this section
+            positions = [position[key] for key in keys]
+            if tuple(positions) not in unique:
+                unique[tuple(positions)] = (score_timetable(ttable), positions, ttable)
+        self.candidates = list(unique.values())
+
+    def ranked(self, ranks: list[int]) -> list[list[SectInfo]]:
+        """Return the best MAX_TTABLES timetables in the order of the given ranks (as in get_ttables_ranked).
+
+        Preconditions:
+        - sorted(ranks) == [0, 1, 2]
+        """
+        return [candidate[2] for candidate in heapq.nsmallest(
+            MAX_TTABLES, self.candidates, key=lambda candidate: ([candidate[0][rank] for rank in ranks], candidate[1]))]
+
+
+def get_ranked_candidates(wanted: set[str], workers: int = 1) -> RankedCandidates:
+    """
+    Return the RankedCandidates of the wanted courses under every ranking in ALL_RANKS. Each search is seeded with the
+    timetables found by the ones before it.
+    """
+    ttables = []
+    for ranks in ALL_RANKS:
+        ttables.extend(get_ttables_ranked(wanted, ranks, workers=workers, seeds=ttables))
+    return RankedCandidates(ttables)
+
+
+class SearchSession:
+    """The results of the searches of one user, so that each search can start from the ones before it.
+
+    Users usually change their course selection one course at a time, so most searches are for a course set that has
+    been searched before (with the same or different ranks), or that differs from one by a few courses. A search for a
+    set and ranks that are already cached returns at once. Otherwise, the cached timetables are turned into timetables
+    of the new set and passed to get_ttables_ranked as seeds: those of the same courses as they are, those of more
+    courses with the extra courses left out, and those of at most MAX_MISSING_COURSES fewer courses extended with up to
+    EXTENSIONS_PER_TIMETABLE ways of adding the missing courses. More missing courses could take a search of their own
+    to find that none of them fit.
+
+    A session can be used from several threads at once, for example to start a search in the background as soon as
+    the selection changes.
+
+    Instance Attributes:
+    - size: The largest number of results kept
+    - results: The timetables found for each (set of courses, ranks), from least to most recently used
+    - lock: The lock held while results is read or changed
+
+    Representation Invariants:
+    - len(self.results) <= self.size
+    """
+    size: int
+    results: OrderedDict[tuple[frozenset[str], tuple[int, ...]], list[list[SectInfo]]]
+    lock: threading.Lock
+
+    def __init__(self, size: int = SESSION_SIZE) -> None:
+        self.size = size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def lookup(self, wanted: set[str], ranks: list[int]) -> Optional[list[list[SectInfo]]]:
+        """Return the cached timetables of the wanted courses with the given ranks, or None if there are none."""
+        key = (frozenset(wanted), tuple(ranks))
+        with self.lock:
+            if key not in self.results:
+                return None
+            self.results.move_to_end(key)
+            return self.results[key]
+
+    def get_ttables(self, wanted: set[str], ranks: list[int],
+                    progress: Optional[Callable[[int, int, list[list[SectInfo]]], None]] = None,
+                    stats: Optional[SearchStats] = None) -> list[list[SectInfo]]:
+        """Return the same timetables as get_ttables_ranked(wanted, ranks, progress=progress, stats=stats), from the
+        cache or from a search seeded with the cached timetables, and cache them. stats is left as it is if the
+        timetables were cached."""
+        ttables = self.lookup(wanted, ranks)
+        if ttables is None:
+            ttables = get_ttables_ranked(wanted, ranks, progress=progress, stats=stats,
+                                         seeds=self.seeds(wanted, progress))
+            with self.lock:
+                self.results[(frozenset(wanted), tuple(ranks))] = ttables
+                if len(self.results) > self.size:
+                    self.results.popitem(last=False)
+        return ttables
+
+    def get_candidates(self, wanted: set[str],
+                       progress: Optional[Callable[[int, int, list[list[SectInfo]]], None]] = None) -> RankedCandidates:
+        """Return the RankedCandidates of the wanted courses, made of their timetables under every ranking in
+        ALL_RANKS (see get_ttables), so that any ranking is a quick sort of them."""
+        return RankedCandidates([ttable for ranks in ALL_RANKS
+                                 for ttable in self.get_ttables(wanted, ranks, progress=progress)])
+
+    def seeds(self, wanted: set[str],
+              progress: Optional[Callable[[int, int, list[list[SectInfo]]], None]] = None) -> list[list[SectInfo]]:
+        """Return conflict-free timetables of the wanted courses made from the cached timetables of the same courses,
+        of more courses, and of at most MAX_MISSING_COURSES fewer courses. If progress is given, it is called with
+        (0, 0, []) before each cached result of fewer courses is extended, so that it can raise SearchCancelled."""
+        wanted = frozenset(wanted)
+        with self.lock:
+            cached = list(self.results.items())
+        seeds = []
+        for (courses, _), ttables in cached:
+            if courses >= wanted:
+                seeds.extend([sect for sect in ttable if sect.course in wanted] for ttable in ttables)
+            elif courses < wanted and len(wanted - courses) <= MAX_MISSING_COURSES:
+                if progress is not None:
+                    progress(0, 0, [])
+                missing = parse_course_csv(set(wanted - courses))
+                for ttable in ttables:
+                    occupied = 0
+                    for sect in ttable:
+                        occupied |= sect.occupancy
+                    extensions = iter_ttables(missing, sorted(missing), occupied)
+                    seeds.extend(ttable + extension
+                                 for extension in itertools.islice(extensions, EXTENSIONS_PER_TIMETABLE))
+        return seeds
+
+
+def score_timetable(ttable: list[SectInfo]) -> tuple[float, int, int]:
+    """
+    Return the average distance between consecutive lectures, the number of morning classes, and the number of evening
+    classes of a timetable, in that order (see _compute_scores).
+    """
+    distance, morning, evening = _compute_scores(ttable, [0, 1, 2])
+    return distance, morning, evening
+
+
+def _search_parallel(course_dict: dict[str, list[SectInfo]], course_names: list[str], ranks: list[int],
+                     propagate: bool, workers: int, timed: bool = False,
+                     seeds: Optional[list[tuple[int, ...]]] = None) -> tuple[list[list[SectInfo]], dict[str, float]]:
+    """
+    Return the same timetables as _RankedSearch(course_dict, course_names, ranks, propagate).run(), using a pool of
+    workers processes, together with the counters of every subproblem added up. The search is split into subproblems
+    by fixing the sections of the one or two courses with the most sections (see _split_search), each subproblem keeps
+    its own best MAX_TTABLES timetables, and these are merged by their scores and section positions, so the result
+    does not depend on which process finishes first.
+
+    Every subproblem is seeded with seeds (see _RankedSearch.seed), so a seed can be returned by several of them, and
+    duplicates are dropped before merging.
+    """
+    subproblems = _split_search(course_dict, course_names, SUBPROBLEMS_PER_WORKER * workers)
+    entries, counters = set(), {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(course_dict, course_names, ranks, propagate, timed, seeds or [])) as executor:
+        for sub_entries, sub_counters in executor.map(_solve_subproblem, subproblems):
+            entries.update(sub_entries)
+            for name, value in sub_counters.items():
+                counters[name] = counters.get(name, 0) + value
+
+    return ([[course_dict[name][-neg_position] for name, neg_position in zip(course_names, entry[1])]
+             for entry in heapq.nlargest(MAX_TTABLES, entries)], counters)
+
+
+def _split_search(course_dict: dict[str, list[SectInfo]], course_names: list[str],
+                  enough: int) -> list[dict[int, int]]:
+    """
+    Return the subproblems of a search, as mappings from the index of a course in course_names to the position of its
+    fixed section. The course with the most sections is fixed first, and if that gives fewer than enough subproblems,
+    the course with the next most sections is fixed too. Subproblems whose fixed sections conflict are left out.
+    """
+    order = sorted(range(len(course_names)), key=lambda i: -len(course_dict[course_names[i]]))
+    subproblems = [({}, 0)]
+    for i in order[:2]:
+        if len(subproblems) >= enough:
+            break
+        subproblems = [({**fixed, i: position}, occupied | sect.occupancy)
+                       for fixed, occupied in subproblems
+                       for position, sect in enumerate(course_dict[course_names[i]])
+                       if not check_conflict(occupied, sect.occupancy)]
+    return [fixed for fixed, _ in subproblems]
+
+
+# The arguments shared by every subproblem solved by a worker process of _search_parallel
+_worker_args = ()
+
+
+def _init_worker(course_dict: dict[str, list[SectInfo]], course_names: list[str], ranks: list[int],
+                 propagate: bool, timed: bool, seeds: list[tuple[int, ...]]) -> None:
+    """Store the arguments shared by every subproblem in a worker process of _search_parallel."""
+    global _worker_args
+    _worker_args = (course_dict, course_names, ranks, propagate, timed, seeds)
+
+
+def _solve_subproblem(fixed: dict[int, int]) -> tuple[list[tuple[tuple[float, ...], tuple[int, ...]]],
+                                                      dict[str, float]]:
+    """
+    Return the (negated scores, negated positions) of the best MAX_TTABLES timetables of a subproblem from
+    _split_search, and the counters of its search. Positions are returned instead of the sections themselves so that
+    the parent process can map them back to its own SectInfo objects.
+    """
+    course_dict, course_names, ranks, propagate, timed, seeds = _worker_args
+    search = _RankedSearch(course_dict, course_names, ranks, propagate, fixed=fixed, timed=timed)
+    search.seed(seeds)
+    search.run()
+    return [entry[:2] for entry in search.heap], search.counters()
+
+
+def _expand_ttables(best: list[list[SectInfo]], course_dict: dict[str, list[SectInfo]],
+                    classes: dict[str, list[list[SectInfo]]], ranks: list[int]) -> list[list[SectInfo]]:
+    """
+    Return the best MAX_TTABLES timetables made by replacing each section of the timetables in best (which only use
+    the first section of each class in classes) with any section of its class.
+
+    All of these timetables have the same scores as the one they came from, so ties are broken by the positions of
+    their sections in course_dict, which gives the same order as ranking every concrete timetable with a stable sort.
+    Since best holds the best MAX_TTABLES timetables over the classes, no other timetable can make it into the result.
+    """
+    position = {id(sect): i for name in course_dict for i, sect in enumerate(course_dict[name])}
+    members = {id(group[0]): group for name in classes for group in classes[name]}
+    candidates = []
+    for ttable in best:
+        scores = _compute_scores(ttable, ranks)
+        for concrete in itertools.islice(itertools.product(*(members[id(sect)] for sect in ttable)), MAX_TTABLES):
+            candidates.append((scores, [position[id(sect)] for sect in concrete], list(concrete)))
+
+    candidates.sort(key=lambda candidate: candidate[:2])
+    return [candidate[2] for candidate in candidates[:MAX_TTABLES]]
+
+
+class _RankedSearch:
+    """A branch-and-bound search for the best MAX_TTABLES timetables of a course_dict.
+
+    Once MAX_TTABLES timetables have been kept, a partial timetable is only explored further if its optimistic scores
+    could still beat the worst kept timetable. Morning and evening counts are additive per section, so their bounds
+    are the counts so far plus the fewest possible for each remaining course. The average distance bound only counts
+    the days that no remaining section can touch (see distance_lower_bound). Ties are broken by the positions of the
+    sections in course_dict, so the result does not depend on the order the search runs in.
+
+    If fixed is given, each course index in it can only use the section at the given position, which is how
+    _search_parallel splits a search into subproblems.
+
+    If propagate is True, the search uses forward checking: after each section is added, the sections that conflict
+    with it are removed from the domains of the remaining courses, and the search backtracks as soon as a domain is
+    empty. Domains are bitsets of section positions, so this only intersects each of them with the bitset of the
+    sections that fit with the new section in a CompatibilityMatrix computed once for the search. The next course is
+    always the one with the fewest sections left in its domain, so dead ends (and course sets that conflict with
+    each other) are found early. Otherwise, courses are added in the order of course_names.
+
+    The scores are accumulated along the path instead of being recomputed for each complete timetable: the morning
+    and evening counts are passed down the search, and the lectures and consecutive distances of each semester and
+    day are updated only for the days touched by each section that is added.
+
+    Instance Attributes:
+    - ranks: The user's ranking of the three scores, as passed to _compute_scores
+    - propagate: Whether to use forward checking and most-constrained-first ordering
+    - options: For each course in order, a list of its sections as (position, section, morning, evening, lecture
+               counts) tuples
+    - compatible: The CompatibilityMatrix of the courses
+    - domains: For each course in order, the bitset of the positions of the sections it can use
+    - heap: The timetables kept so far, as (negated scores, negated positions, timetable) so heap[0] is the worst
+    - path: The section chosen for each course in the partial timetable currently being explored, or None
+    - positions: The position in course_dict of each section in path
+    - days: The lectures of path on each semester and day (numbered sem * len(DAYS) + day), as (start, course index,
+            building code) tuples in the order used by _merge_days
+    - dists: The distances between consecutive lectures in each list of days, in order
+    - nodes: The number of partial timetables explored so far
+    - scored: The number of complete timetables scored so far
+    - tried: The number of sections tried as the next section of a partial timetable so far
+    - rejected: The number of those sections that conflicted or emptied the domain of a remaining course
+    - pruned: The number of partial timetables found to be hopeless so far
+    - timed: Whether to measure the time spent scoring complete timetables
+    - score_seconds: The time spent scoring complete timetables so far, if timed is True
+    - report: A function called every PROGRESS_INTERVAL partial timetables with nodes, scored and the kept timetables
+              in ranked order, or None
+    - seeded: The negated positions of the timetables kept by seed, which the search skips when it finds them again
+
+    Representation Invariants:
+    - len(self.heap) <= MAX_TTABLES
+    - len(self.path) == len(self.positions) == len(self.options) == len(self.domains)
+    - len(self.days) == len(self.dists) == 2 * len(DAYS)
+    """
+    ranks: list[int]
+    propagate: bool
+    options: list[list[tuple[int, SectInfo, int, int, int]]]
+    compatible: CompatibilityMatrix
+    domains: list[int]
+    heap: list[tuple[tuple[float, ...], tuple[int, ...], list[SectInfo]]]
+    path: list[Optional[SectInfo]]
+    positions: list[int]
+    days: list[list[tuple[float, int, str]]]
+    dists: list[list[float]]
+    nodes: int
+    scored: int
+    tried: int
+    rejected: int
+    pruned: int
+    timed: bool
+    score_seconds: float
+    report: Optional[Callable[[int, int, list[list[SectInfo]]], None]]
+    seeded: set[tuple[int, ...]]
+
+    def __init__(self, course_dict: dict[str, list[SectInfo]], course_names: list[str], ranks: list[int],
+                 propagate: bool = True, fixed: Optional[dict[int, int]] = None, timed: bool = False) -> None:
+        self.ranks = ranks
+        self.propagate = propagate
+        self.options = [[(position, sect, sect.compiled.morning, sect.compiled.evening, sect.compiled.num_lectures)
+                         for position, sect in enumerate(course_dict[name])] for name in course_names]
+        self.compatible = CompatibilityMatrix(course_dict, course_names)
+        self.domains = list(self.compatible.full)
+        for i, position in (fixed or {}).items():
+            self.domains[i] = 1 << position
+        self.heap = []
+        self.path = [None] * len(course_names)
+        self.positions = [0] * len(course_names)
+        self.days = [[] for _ in range(2 * len(DAYS))]
+        self.dists = [[] for _ in range(2 * len(DAYS))]
+        self.nodes = 0
+        self.scored = 0
+        self.tried = 0
+        self.rejected = 0
+        self.pruned = 0
+        self.timed = timed
+        self.score_seconds = 0.0
+        self.report = None
+        self.seeded = set()
+
+    def seed(self, seeds: list[tuple[int, ...]]) -> None:
+        """Keep the best MAX_TTABLES of the given conflict-free timetables (as the positions of their sections in
+        course_dict) before the search runs, so that it can prune from the start. The result of the search doesn't
+        change, since every timetable it keeps instead is at least as good as the ones it replaces.
+
+        Preconditions:
+        - self.heap == []
+        """
+        for positions in seeds:
+            ttable = [self.options[k][position][1] for k, position in enumerate(positions)]
+            self.heap.append((tuple(-score for score in _compute_scores(ttable, self.ranks)),
+                              tuple(-position for position in positions), ttable))
+        self.heap = heapq.nlargest(MAX_TTABLES, self.heap)
+        heapq.heapify(self.heap)
+        self.seeded = {entry[1] for entry in self.heap}
+
+    def run(self) -> list[list[SectInfo]]:
+        """Run the search and return the kept timetables in ranked order."""
+        if self.domains:
+            self._visit(dict(enumerate(self.domains)), 0, 0, 0)
+        return self.best()
+
+    def best(self) -> list[list[SectInfo]]:
+        """Return the timetables kept so far in ranked order."""
+        return [entry[2] for entry in sorted(self.heap, reverse=True)]
+
+    def counters(self) -> dict[str, float]:
+        """Return the counters of the search so far, by the name of the matching attribute of SearchStats."""
+        return {'pair_checks': self.compatible.checks, 'pair_conflicts': self.compatible.conflicts,
+                'nodes': self.nodes, 'scored': self.scored, 'tried': self.tried, 'rejected': self.rejected,
+                'pruned': self.pruned, 'score_seconds': self.score_seconds}
+
+    def _visit(self, domains: dict[int, int], occupied: int, morning: int, evening: int) -> None:
+        """Explore every way of completing self.path by choosing a section from the domain of each remaining course,
+        where domains maps the index of each course that has no section in self.path yet to its domain bitset."""
+        self.nodes += 1
+        if self.report is not None and self.nodes % PROGRESS_INTERVAL == 0:
+            self.report(self.nodes, self.scored, self.best())
+
+        if not domains:
+            self._score(self.dists, morning, evening)
+            return
+        elif self._is_hopeless(domains, morning, evening):
+            self.pruned += 1
+            return
+
+        if self.propagate:
+            i = min(domains, key=lambda k: (domains[k].bit_count(), k))
+        else:
+            i = min(domains)
+        for sect, sect_morning, sect_evening, new_domains in self._branch(domains, i, occupied):
+            self._visit(new_domains, occupied | sect.occupancy, morning + sect_morning, evening + sect_evening)
+
+    def _branch(self, domains: dict[int, int], i: int,
+                occupied: int = 0) -> Iterator[tuple[SectInfo, int, int, dict[int, int]]]:
+        """Yield (section, morning classes, evening classes, domains of the other courses) for each section in the
+        domain of the course at index i that fits with the sections chosen so far, where domains maps the index of each
+        course without a section yet to its domain bitset and occupied is the occupancy of self.path. While a section
+        is yielded, it is in self.path and self.positions and its lectures are in self.days and self.dists.
+
+        If self.propagate is True, the domains of the other courses only keep the sections that fit with the yielded
+        one, and sections that leave one of them empty are skipped. Otherwise, sections that conflict with occupied are
+        skipped and the other domains are unchanged.
+        """
+        rest = {k: domains[k] for k in domains if k != i}
+        self.tried += domains[i].bit_count()
+        for a in iter_bits(domains[i]):
+            position, sect, sect_morning, sect_evening, _ = self.options[i][a]
+            if self.propagate:
+                # Every section left in the domain already fits with the sections chosen so far
+                compatible = self.compatible.masks[i][a]
+                new_domains = {k: rest[k] & compatible[k] for k in rest}
+                if not all(new_domains.values()):
+                    self.rejected += 1
+                    continue  # Some remaining course has no section left that fits
+            elif check_conflict(occupied, sect.occupancy):
+                self.rejected += 1
+                continue
+            else:
+                new_domains = rest
+            self.path[i], self.positions[i] = sect, position
+            saved = self._add_lectures(i, sect)
+            yield sect, sect_morning, sect_evening, new_domains
+            for d, lectures, dists in saved:
+                self.days[d], self.dists[d] = lectures, dists
+        self.path[i] = None
+
+    def _add_lectures(self, i: int, sect: SectInfo) -> list[tuple[int, list, list[float]]]:
+        """Add the lectures of sect, the section of the course at index i, to self.days and self.dists, and return the
+        (day, lectures, distances) that were replaced so they can be restored."""
+        saved = []
+        for d, lectures in sect.compiled.days:
+            saved.append((d, self.days[d], self.dists[d]))
+            # Ties are broken by course index and then by the order within the section, as in _merge_days
+            new = sorted(self.days[d] + [(lecture[0], i, lecture[2]) for lecture in lectures], key=itemgetter(0, 1))
+            self.days[d] = new
+            self.dists[d] = [building_distance(new[j][2], new[j + 1][2]) for j in range(len(new) - 1)]
+        return saved
+
+    def _score(self, dists: Iterable[Iterable[float]], morning: int, evening: int,
+               placed: Iterable[tuple[int, int]] = ()) -> None:
+        """Score a complete timetable the same way as _compute_scores and keep it with _keep. The timetable has the
+        given lists of distances between consecutive lectures (for each semester and day in order) and numbers of
+        morning and evening classes, and its sections are at self.positions once the (course index, position) pairs in
+        placed are written there, which _keep only does if the timetable could be kept."""
+        start = time.perf_counter() if self.timed else 0.0
+        self.scored += 1
+        # The set is always filled in the order of the semesters and days, so the average doesn't depend on the search
+        all_dists = set()
+        for day_dists in dists:
+            all_dists.update(day_dists)
+        self._keep([sum(all_dists) / len(all_dists) if all_dists else 0, morning, evening], placed)
+        if self.timed:
+            self.score_seconds += time.perf_counter() - start
+
+    def _keep(self, lst_scores: list[float], placed: Iterable[tuple[int, int]]) -> None:
+        """Keep the complete timetable with the given scores, whose sections are at self.positions with the (course
+        index, position) pairs in placed, if it is one of the best MAX_TTABLES found so far."""
+        scores = tuple(-lst_scores[rank] for rank in self.ranks)
+        if len(self.heap) == MAX_TTABLES and scores < self.heap[0][0]:
+            return
+        for k, position in placed:
+            self.positions[k] = position
+        entry = (scores, tuple(-position for position in self.positions), self._timetable())
+        if self.seeded and entry[1] in self.seeded:
+            pass  # It was kept by seed before the search started
+        elif len(self.heap) < MAX_TTABLES:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def _timetable(self) -> list[SectInfo]:
+        """Return the timetable whose sections are at self.positions."""
+        return [self.options[k][position][1] for k, position in enumerate(self.positions)]
+
+    def _is_hopeless(self, domains: dict[int, int], morning: int, evening: int) -> bool:
+        """Return whether no completion of self.path using the given domains can beat the worst kept timetable. The
+        bounds are compared in the user's order, and the distance bound is only computed if the earlier bounds tie. If
+        all the bounds tie, the lowest positions any completion could have decide. Nothing is hopeless until
+        MAX_TTABLES timetables have been kept.
+        """
+        if len(self.heap) < MAX_TTABLES:
+            return False
+        worst_scores, worst_positions, _ = self.heap[0]
+        options = [[self.options[k][a] for a in iter_bits(domains[k])] for k in domains]
+        for rank, neg_score in zip(self.ranks, worst_scores):
+            if rank == 0:
+                bound = self._distance_bound(options)
+            elif rank == 1:
+                bound = morning + sum(min(option[2] for option in domain) for domain in options)
+            else:
+                bound = evening + sum(min(option[3] for option in domain) for domain in options)
+            if bound != -neg_score:
+                return bound > -neg_score
+
+        # The lowest position left in a domain is that of its lowest bit
+        lowest = tuple((domains[k] & -domains[k]).bit_length() - 1 if k in domains else self.positions[k]
+                       for k in range(len(self.path)))
+        return lowest > tuple(-position for position in worst_positions)
+
+    def _distance_bound(self, options: list[list[tuple[int, SectInfo, int, int, int]]]) -> float:
+        """Return a lower bound on the average distance score of any completion of self.path that takes one of the
+        given options for each remaining course (see distance_lower_bound)."""
+        reach = 0
+        for domain in options:
+            for option in domain:
+                reach |= option[1].occupancy
+        return distance_lower_bound(self.days, self.dists, reach,
+                                     sum(max(option[4] for option in domain) for domain in options))
+
+
+class _SemesterSearch(_RankedSearch):
+    """A search for the same timetables as _RankedSearch that searches the fall and winter terms separately.
+
+    Sections of fall (-F) courses never conflict with sections of winter (-S) courses, so only the year-long (-Y)
+    courses tie the two terms together. This search first branches on the sections of the year-long courses. For each
+    choice of them, it lists every way of completing each term on its own, which takes the sum of the work of the two
+    terms instead of their product, and then merges the two lists with a k-best merge.
+
+    The morning and evening counts of a timetable are the sums of those of its two terms, but the average distance is
+    over the set of distinct distances of both terms together, so it does not split. The merge is a branch-and-bound
+    over pairs of term completions: each completion gets a bound on the scores of any pair it is in, using the fewest
+    morning and evening classes of the other term and the smallest distances the other term could add (see
+    _union_lower_bound). Both lists are sorted by these bounds, so the merge stops as soon as they cannot beat the
+    worst kept timetable, and the distance of a pair is only computed if the bounds of the pair could beat it. If the
+    first ranked score is a count, a term completion is dropped before the merge if MAX_TTABLES others of its term
+    have better counts in the scores ranked before the distance, since each of those with the same completion of the
+    other term would beat it, and the search of each term skips partial completions that are already beaten this way.
+
+    Every search always uses forward checking, and the timetables are kept and tie-broken as in _RankedSearch.
+
+    Instance Attributes:
+    - year: The indexes of the year-long courses
+    - terms: The indexes of the fall courses and of the winter courses
+    - term_days: The semesters and days (numbered sem * len(DAYS) + day) of the fall term and of the winter term
+    - before: The counts ranked before the distance, as in ranks
+    - cutoffs: The best counts in before of the completions of the term being searched so far, negated so that
+               cutoffs[0] is the worst of them
+
+    Representation Invariants:
+    - len(self.cutoffs) <= MAX_TTABLES
+    """
+    year: list[int]
+    terms: tuple[list[int], list[int]]
+    term_days: tuple[range, range]
+    before: list[int]
+    cutoffs: list[tuple[int, ...]]
+
+    def __init__(self, course_dict: dict[str, list[SectInfo]], course_names: list[str], ranks: list[int],
+                 timed: bool = False) -> None:
+        _RankedSearch.__init__(self, course_dict, course_names, ranks, True, timed=timed)
+        self.year = [i for i, name in enumerate(course_names) if name.endswith('Y')]
+        self.terms = ([i for i, name in enumerate(course_names) if name.endswith('F')],
+                      [i for i, name in enumerate(course_names) if name.endswith('S')])
+        self.term_days = (range(len(DAYS)), range(len(DAYS), 2 * len(DAYS)))
+        self.before = ranks[:ranks.index(0)]
+        self.cutoffs = []
+
+    def run(self) -> list[list[SectInfo]]:
+        """Run the search and return the kept timetables in ranked order."""
+        if self.domains and all(self.domains):
+            self._visit_year(dict(enumerate(self.domains)), 0, 0)
+        return self.best()
+
+    def _count_node(self) -> None:
+        """Count one more partial timetable (or pair of term completions), reporting progress if it is time to."""
+        self.nodes += 1
+        if self.report is not None and self.nodes % PROGRESS_INTERVAL == 0:
+            self.report(self.nodes, self.scored, self.best())
+
+    def _visit_year(self, domains: dict[int, int], morning: int, evening: int) -> None:
+        """Try every choice of sections for the year-long courses left in domains, which maps the index of each course
+        without a section yet to its domain bitset, and merge the completions of the two terms for each of them."""
+        self._count_node()
+        year = [k for k in domains if k in self.year]
+        if not year:
+            terms = []
+            for term in range(len(self.terms)):
+                found, self.cutoffs = [], []
+                self._visit_term({k: domains[k] for k in self.terms[term]}, term, 0, 0, found)
+                terms.append(self._drop_beaten(found))
+            self._merge(terms[0], terms[1], morning, evening)
+            return
+
+        i = min(year, key=lambda k: (domains[k].bit_count(), k))
+        for _, sect_morning, sect_evening, new_domains in self._branch(domains, i):
+            self._visit_year(new_domains, morning + sect_morning, evening + sect_evening)
+
+    def _visit_term(self, domains: dict[int, int], term: int, morning: int, evening: int,
+                    found: list[tuple[int, int, tuple[tuple[int, int], ...], tuple[float, ...]]]) -> None:
+        """Append every way of completing the term at index term of self.terms, whose courses without a section yet
+        have the given domains, to found as (morning classes, evening classes, (course index, position) of each
+        section, distances between consecutive lectures on the days of the term in order). If some counts are ranked
+        before the distance, completions that are already beaten on them (see _term_is_beaten) may be left out."""
+        self._count_node()
+        if not domains:
+            found.append((morning, evening, tuple((k, self.positions[k]) for k in self.terms[term]),
+                          tuple(itertools.chain.from_iterable(self.dists[d] for d in self.term_days[term]))))
+            if self.before:
+                cutoff = tuple(-(morning, evening)[rank - 1] for rank in self.before)
+                if len(self.cutoffs) < MAX_TTABLES:
+                    heapq.heappush(self.cutoffs, cutoff)
+                elif cutoff > self.cutoffs[0]:
+                    heapq.heapreplace(self.cutoffs, cutoff)
+            return
+        elif len(self.cutoffs) == MAX_TTABLES and self._term_is_beaten(domains, morning, evening):
+            self.pruned += 1
+            return
+
+        i = min(domains, key=lambda k: (domains[k].bit_count(), k))
+        for _, sect_morning, sect_evening, new_domains in self._branch(domains, i):
+            self._visit_term(new_domains, term, morning + sect_morning, evening + sect_evening, found)
+
+    def _term_is_beaten(self, domains: dict[int, int], morning: int, evening: int) -> bool:
+        """Return whether every completion of the term being searched, with the given domains and numbers of morning
+        and evening classes so far, has worse counts in self.before than MAX_TTABLES completions already found.
+
+        Preconditions:
+        - len(self.cutoffs) == MAX_TTABLES
+        """
+        bound = [morning, evening]
+        for rank in self.before:
+            bound[rank - 1] += sum(min(self.options[k][a][rank + 1] for a in iter_bits(domains[k])) for k in domains)
+        return tuple(-bound[rank - 1] for rank in self.before) < self.cutoffs[0]
+
+    def _drop_beaten(self, found: list[tuple]) -> list[tuple]:
+        """Return the completions of a term in found without those that MAX_TTABLES others beat on the counts ranked
+        before the distance (which can't be part of a kept timetable)."""
+        before = self.ranks[:self.ranks.index(0)]
+        if not before or len(found) <= MAX_TTABLES:
+            return found
+        counts = sorted(tuple(completion[rank - 1] for rank in before) for completion in found)
+        cutoff = counts[MAX_TTABLES - 1]
+        kept = [completion for completion in found if tuple(completion[rank - 1] for rank in before) <= cutoff]
+        self.pruned += len(found) - len(kept)
+        return kept
+
+    def _bounds(self, completions: list[tuple], others: list[tuple], morning: int,
+                evening: int) -> list[tuple[tuple[float, ...], float, tuple]]:
+        """Return (negated bound on the scores, bound on the distance, completion) for each of the completions of one
+        term, paired with any of the completions of the other term and a choice of year-long sections that has the
+        given numbers of morning and evening classes, from best to worst bound."""
+        other_dists = sorted(set(itertools.chain.from_iterable(other[3] for other in others)))
+        most = max(len(set(other[3])) for other in others)
+        fewest_morning = min(other[0] for other in others)
+        fewest_evening = min(other[1] for other in others)
+        bounded = []
+        for completion in completions:
+            distance = _union_lower_bound(set(completion[3]), other_dists, most)
+            lst_scores = [distance, morning + completion[0] + fewest_morning, evening + completion[1] + fewest_evening]
+            bounded.append((tuple(-lst_scores[rank] for rank in self.ranks), distance, completion))
+        bounded.sort(key=itemgetter(0), reverse=True)
+        return bounded
+
+    def _merge(self, fall: list[tuple], winter: list[tuple], morning: int, evening: int) -> None:
+        """Keep every timetable made of a completion of the fall term in fall and one of the winter term in winter
+        (with the current choice of year-long sections, which has the given numbers of morning and evening classes)
+        that is one of the best MAX_TTABLES found so far."""
+        if not fall or not winter:
+            return
+        fall_bounds = self._bounds(fall, winter, morning, evening)
+        winter_bounds = self._bounds(winter, fall, morning, evening)
+        for fall_key, fall_distance, (fall_morning, fall_evening, fall_positions, fall_dists) in fall_bounds:
+            if len(self.heap) == MAX_TTABLES and fall_key < self.heap[0][0]:
+                self.pruned += 1
+                break
+            for winter_key, winter_distance, completion in winter_bounds:
+                if len(self.heap) == MAX_TTABLES and winter_key < self.heap[0][0]:
+                    self.pruned += 1
+                    break
+                self._count_node()
+                lst_scores = [max(fall_distance, winter_distance), morning + fall_morning + completion[0],
+                              evening + fall_evening + completion[1]]
+                if len(self.heap) == MAX_TTABLES and tuple(-lst_scores[rank] for rank in self.ranks) < self.heap[0][0]:
+                    self.pruned += 1
+                    continue
+                self._score((fall_dists, completion[3]), lst_scores[1], lst_scores[2],
+                            itertools.chain(fall_positions, completion[2]))
+
+
+class _ParetoSearch(_SemesterSearch):
+    """A branch-and-bound search for the Pareto frontier of the timetables of a course_dict, over their average
+    distance, number of morning classes and number of evening classes (all to be minimized).
+
+    The frontier is kept as a skyline keyed by the morning and evening counts: since these are small integers, it has
+    at most one timetable for each pair of them, the one with the lowest distance. A timetable is dominated if a kept
+    one has at most its counts and at most its distance (with equal scores, if it has lower positions), and kept
+    timetables that a new one dominates are dropped, so the kept timetables are always the frontier of those found so
+    far. The result does not depend on the order the search runs in.
+
+    If decompose is True and there are both fall and winter courses, the two terms are searched separately as in
+    _SemesterSearch. Before the merge, the completions of a term with the same set of distances are reduced to those
+    whose counts no other of them matches or beats, since with any completion of the other term they give the same
+    distance and fewer classes. A pair of completions is skipped if its bounds (see _SemesterSearch) are already
+    dominated. Otherwise, the search runs as in _RankedSearch, and a partial timetable is pruned if its optimistic
+    scores are dominated with the lowest positions any completion could have, since then every completion of it is
+    dominated too.
+
+    Instance Attributes:
+    - decompose: Whether the two terms are searched separately
+    - frontier: The non-dominated timetables found so far, as (distance, positions, timetable) by their (morning,
+                evening) counts
+
+    Representation Invariants:
+    - self.heap == []
+    - self.before == []
+    - no timetable in self.frontier dominates another
+    """
+    decompose: bool
+    frontier: dict[tuple[int, int], tuple[float, tuple[int, ...], list[SectInfo]]]
+
+    def __init__(self, course_dict: dict[str, list[SectInfo]], course_names: list[str], ranks: list[int],
+                 propagate: bool = True, decompose: bool = True, timed: bool = False) -> None:
+        _SemesterSearch.__init__(self, course_dict, course_names, ranks, timed)
+        self.before = []  # No count is ranked first on the frontier, so no term completion is beaten on it alone
+        self.decompose = decompose and all(self.terms)
+        self.propagate = propagate or self.decompose  # The terms are always searched with forward checking
+        self.frontier = {}
+
+    def run(self) -> list[list[SectInfo]]:
+        """Run the search and return the frontier in the order given by self.ranks, which is empty if some course has
+        no sections."""
+        if not all(self.domains):
+            return []
+        elif self.decompose:
+            return _SemesterSearch.run(self)
+        return _RankedSearch.run(self)
+
+    def points(self) -> list[tuple[tuple[float, int, int], tuple[int, ...], list[SectInfo]]]:
+        """Return the frontier found so far as (scores, positions, timetable) tuples, with the scores in the order of
+        score_timetable."""
+        return [((distance, morning, evening), positions, ttable)
+                for (morning, evening), (distance, positions, ttable) in self.frontier.items()]
+
+    def best(self) -> list[list[SectInfo]]:
+        """Return the frontier found so far in the order given by self.ranks."""
+        return [point[2] for point in sorted(self.points(),
+                                             key=lambda point: ([point[0][rank] for rank in self.ranks], point[1]))]
+
+    def _keep(self, lst_scores: list[float], placed: Iterable[tuple[int, int]]) -> None:
+        """Add the complete timetable with the given scores, whose sections are at self.positions with the (course
+        index, position) pairs in placed, to the frontier unless it is dominated, and drop the kept timetables that it
+        dominates."""
+        for k, position in placed:
+            self.positions[k] = position
+        distance, morning, evening = lst_scores
+        positions = tuple(self.positions)
+        if not self._is_dominated(distance, morning, evening, positions):
+            for key in [key for key in self.frontier
+                        if key[0] >= morning and key[1] >= evening and self.frontier[key][0] >= distance]:
+                del self.frontier[key]
+            self.frontier[(morning, evening)] = (distance, positions, self._timetable())
+
+    def _is_hopeless(self, domains: dict[int, int], morning: int, evening: int) -> bool:
+        """Return whether every completion of self.path using the given domains is dominated by a kept timetable. The
+        distance bound is only computed if some kept timetable has at most the fewest morning and evening classes of
+        any completion."""
+        options = [[self.options[k][a] for a in iter_bits(domains[k])] for k in domains]
+        morning += sum(min(option[2] for option in domain) for domain in options)
+        evening += sum(min(option[3] for option in domain) for domain in options)
+        if not any(key[0] <= morning and key[1] <= evening for key in self.frontier):
+            return False
+
+        # The lowest position left in a domain is that of its lowest bit
+        lowest = tuple((domains[k] & -domains[k]).bit_length() - 1 if k in domains else self.positions[k]
+                       for k in range(len(self.path)))
+        return self._is_dominated(self._distance_bound(options), morning, evening, lowest)
+
+    def _is_dominated(self, distance: float, morning: int, evening: int, positions: tuple[int, ...]) -> bool:
+        """Return whether a timetable with the given scores and positions is dominated by a kept timetable. With
+        positions == (), no kept timetable with the same scores dominates it."""
+        for (kept_morning, kept_evening), (kept_distance, kept_positions, _) in self.frontier.items():
+            if kept_morning <= morning and kept_evening <= evening and kept_distance <= distance and (
+                    (kept_distance, kept_morning, kept_evening) != (distance, morning, evening)
+                    or kept_positions < positions):
+                return True
+        return False
+
+    def _drop_beaten(self, found: list[tuple]) -> list[tuple]:
+        """Return the completions of a term in found without those that another of them with the same set of
+        distances matches or beats on both counts (with the same counts, the one with the lowest positions is kept)."""
+        by_dists = {}
+        for completion in sorted(found, key=itemgetter(2)):
+            by_dists.setdefault(frozenset(completion[3]), []).append(completion)
+        kept = []
+        for completions in by_dists.values():
+            kept.extend(completion for i, completion in enumerate(completions)
+                        if not any(other[0] <= completion[0] and other[1] <= completion[1]
+                                   and (other[:2] != completion[:2] or j < i) for j, other in enumerate(completions)))
+        self.pruned += len(found) - len(kept)
+        return kept
+
+    def _merge(self, fall: list[tuple], winter: list[tuple], morning: int, evening: int) -> None:
+        """Add every timetable made of a completion of the fall term in fall and one of the winter term in winter
+        (with the current choice of year-long sections, which has the given numbers of morning and evening classes)
+        to the frontier, unless it is dominated."""
+        if not fall or not winter:
+            return
+        winter_bounds = self._bounds(winter, fall, morning, evening)
+        for _, fall_distance, (fall_morning, fall_evening, fall_positions, fall_dists) in self._bounds(
+                fall, winter, morning, evening):
+            for _, winter_distance, completion in winter_bounds:
+                self._count_node()
+                pair_morning = morning + fall_morning + completion[0]
+                pair_evening = evening + fall_evening + completion[1]
+                if self._is_dominated(max(fall_distance, winter_distance), pair_morning, pair_evening, ()):
+                    self.pruned += 1
+                    continue
+                self._score((fall_dists, completion[3]), pair_morning, pair_evening,
+                            itertools.chain(fall_positions, completion[2]))
+
+
+def _union_lower_bound(dists: set[float], other_dists: list[float], most: int) -> float:
+    """
+    Return a lower bound on the average of the set of distances made of dists and the distances of a completion of the
+    other term, where other_dists is the sorted list of every distance in any completion of the other term, and no
+    completion has more than most distinct distances.
+
+    The average can only go down by adding distances below it, and goes down the most by adding the smallest ones
+    first. The bound is lowered by a relative 1e-12 so that rounding can never make it exceed an exact average.
+
+    >>> round(_union_lower_bound({1.0, 3.0}, [0.0, 1.0, 5.0], 2), 9)
+    1.333333333
+    >>> _union_lower_bound(set(), [0.0], 1)
+    0.0
+    """
+    if not dists:
+        return 0.0
+    total, count, added = sum(dists), len(dists), 0
+    for dist in other_dists:
+        if added == most or dist * count >= total:
+            break
+        elif dist not in dists:
+            total, count, added = total + dist, count + 1, added + 1
+    return total / count * (1 - 1e-12)
 
 
 def _compute_scores(path: list[SectInfo], ranks: list[int]) -> list[float, int]:
@@ -52,33 +1212,15 @@ def _compute_scores(path: list[SectInfo], ranks: list[int]) -> list[float, int]:
     - set(ranks) == {1, 2, 3}
     """
 
-    master_room_times = _get_master_room_times(path)
     all_dists = set()
     # The first element represents avg dist between buildings, the second represents number of morning classes, and the
     # third represents the number of evening classes.
     lst_scores = [0] * 3
-    for sem in master_room_times:
-        for lst in sem.values():
-            lst_scores[1] += sum(1 for time in lst if time[1][0] < 10.0)
-            lst_scores[2] += sum(1 for time in lst if time[1][1] > 17.0)
-
-            num_dists = len(lst) - 1
-            for i in range(num_dists):
-                start, end = lst[i][0][0].split()[0], lst[i + 1][0][0].split()[0]
-
-                # NOTE, IF A BUILDING ISN'T AVAILABLE, WE ASSUME MAX DISTANCE BETWEEN BUILDINGS
-                if 'NA' in (start, end) or not len(start) == len(end) == 2:
-                    all_dists.add(1.1740529167842144)  # Computed maximum distance between buildings
-                elif start == end:
-                    all_dists.add(0.0)
-                else:
-                    # Uses the Equirectangular approximation formula to calculate distance, where:
-                    # x = change in longitude * cos(mean latitude)
-                    # y = change in latitude
-                    # dist = earth's radius * sqrt(x^2 + y^2)
-
-                    lat1, lon1, lat2, lon2 = parse_coordinates(start, end)
-                    all_dists.add(6371 * (((lon2 - lon1) * cos((lat1 + lat2) / 2)) ** 2 + (lat2 - lat1) ** 2) ** 0.5)
+    for sec in path:
+        lst_scores[1] += sec.compiled.morning
+        lst_scores[2] += sec.compiled.evening
+    for lst in _merge_days(path):
+        all_dists.update(_day_distances(lst))
 
     if not all_dists:
         lst_scores[0] = 0
@@ -88,29 +1230,28 @@ def _compute_scores(path: list[SectInfo], ranks: list[int]) -> list[float, int]:
     return [lst_scores[ranks[0]], lst_scores[ranks[1]], lst_scores[ranks[2]]]
 
 
-def _get_master_room_times(path: list[SectInfo]) -> list[dict[str, list[list[tuple[str | float]]]]]:
+def _merge_days(path: list[SectInfo]) -> list[list[tuple[float, float, str]]]:
     """
-    This function takes in a list of SectInfo objects (essentially a "path" through the Schedule tree), and returns two
-    mappings (one for each semester) from days of the week to all lectures happening on each corresponding day
-    (represented as a list of lists, each of which contains two tuples, one representing the room and the other
-    representing the lecture times).
+    Return the lectures of all the sections in path on each semester and day (numbered sem * len(DAYS) + day), as
+    (start, end, building code) tuples sorted by start time. Lectures that start at the same time keep the order of
+    the sections in path.
     """
-    master = [{'Mon': [], 'Tue': [], 'Wed': [], 'Thu': [], 'Fri': []},
-              {'Mon': [], 'Tue': [], 'Wed': [], 'Thu': [], 'Fri': []}]
-    legend = {'F': 0, 'S': 1}
+    days = [[] for _ in range(2 * len(DAYS))]
     for sec in path:
-        c_type = sec.course[-1]
-        for day in sec.room_times:
-            if c_type == 'Y':
-                for i in range(2):
-                    master[i][day].extend([[(j[0][i],), j[1]] for j in sec.room_times[day]])
-            else:
-                master[legend[c_type]][day].extend(sec.room_times[day])
+        for d, lectures in sec.compiled.days:
+            days[d].extend(lectures)
+    for lst in days:
+        if len(lst) > 1:
+            lst.sort(key=itemgetter(0))
+    return days
+
 
-    for i in range(2):
-        for day in master[i]:
-            master[i][day].sort(key=lambda rm_time: rm_time[1][0])
-    return master
+def _day_distances(lectures: list[tuple[float, float, str]]) -> list[float]:
+    """
+    Return the distances between the buildings of each pair of consecutive lectures in a day, in order, where lectures
+    is sorted by start time as in the output of _merge_days.
+    """
+    return [building_distance(lectures[i][2], lectures[i + 1][2]) for i in range(len(lectures) - 1)]
 
 
 if __name__ == '__main__':